@@ -3,7 +3,7 @@ import json
 
 def get_audio_tracks_count(video_file):
     # Run ffprobe command to get JSON output with audio stream information
-    ffprobe_command = ['ffprobe', '-v', 'error', '-select_streams', 'a:0', '-show_entries', 'stream=index', '-of', 'json', video_file]
+    ffprobe_command = ['ffprobe', '-v', 'error', '-select_streams', 'a', '-show_entries', 'stream=index', '-of', 'json', video_file]
     process = subprocess.Popen(ffprobe_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     stdout, stderr = process.communicate()
 
@@ -0,0 +1,180 @@
+import subprocess
+import json
+import os
+import re
+import sys
+import csv
+import argparse
+
+# This script cuts a long recording into chunks of bounded length, placing each cut in
+# the middle of a silence so no words are split.  It can be pointed at the original
+# video or at one of the audio tracks written by the splitter.
+#
+# Alongside the chunks it writes a manifest ({base_name}_chunks.json) with the start and
+# end of every chunk in the source recording.  Adding a chunk's start offset to the
+# timestamps of its transcript gives timestamps in the original recording, so the chunks
+# can be transcribed in parallel (or retried one at a time) and stitched back together.
+#
+#   python audio-silence-chunker.py "Panel 1.mp4" -o chunks --max-chunk 300
+
+# Chunks are written in the format Whisper resamples everything to (16 kHz mono)
+CHUNK_FORMATS = {
+    'wav': ['-c:a', 'pcm_s16le'],
+    'flac': ['-c:a', 'flac'],
+}
+
+SILENCE_START = re.compile(r'silence_start: (-?[\d.]+)')
+SILENCE_END = re.compile(r'silence_end: (-?[\d.]+)')
+
+
+def get_duration(audio_file):
+    # Run ffprobe command to get the container duration in seconds
+    ffprobe_command = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', audio_file]
+    process = subprocess.Popen(ffprobe_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+
+    # ffprobe can log recoverable problems (a damaged packet, say) and still succeed,
+    # so only the exit status decides whether the duration is usable
+    if process.returncode != 0:
+        print("Error running ffprobe command:")
+        print(stderr.decode())
+        return None
+
+    try:
+        return float(json.loads(stdout.decode())['format']['duration'])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        print("Error parsing ffprobe output.")
+        return None
+
+def detect_silences(audio_file, track=1, noise_db=-35, min_silence=0.5):
+    # silencedetect logs every silence to stderr; the audio itself is discarded.
+    # Downmixing first means the filter only has to look at one channel.
+    ffmpeg_command = ['ffmpeg', '-nostdin', '-hide_banner', '-i', audio_file, '-map', f'0:a:{track - 1}',
+                      '-vn', '-ac', '1', '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}',
+                      '-f', 'null', '-']
+    process = subprocess.Popen(ffmpeg_command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+
+    if process.returncode != 0:
+        print(f"Error detecting silence in {audio_file}:")
+        print(stderr.decode())
+        return None
+
+    silences = []
+    start = None
+    for line in stderr.decode(errors='replace').splitlines():
+        match = SILENCE_START.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+def choose_cut_points(silences, duration, max_chunk=300.0, min_chunk=30.0):
+    # Greedily take the last silence that still keeps the chunk under max_chunk.
+    # If a stretch has no usable silence, fall back to a hard cut at max_chunk.
+    candidates = sorted((start + end) / 2 for start, end in silences)
+    cuts = []
+    chunk_start = 0.0
+    while duration - chunk_start > max_chunk:
+        limit = chunk_start + max_chunk
+        usable = [t for t in candidates if chunk_start + min_chunk <= t <= limit]
+        cut = usable[-1] if usable else limit
+        cuts.append(cut)
+        chunk_start = cut
+    return cuts
+
+def write_chunks(audio_file, output_directory, cuts, track=1, chunk_format='wav'):
+    base_name = os.path.splitext(os.path.basename(audio_file))[0]
+    chunk_pattern = os.path.join(output_directory, f"{base_name}_chunk_%03d.{chunk_format}")
+    segment_list = os.path.join(output_directory, f"{base_name}_chunks.csv")
+
+    # One pass through the segment muxer writes every chunk; its segment list records
+    # the actual start and end time of each chunk, which is what the manifest needs
+    ffmpeg_command = ['ffmpeg', '-nostdin', '-y', '-v', 'error', '-i', audio_file, '-map', f'0:a:{track - 1}',
+                      '-vn', '-ac', '1', '-ar', '16000'] + CHUNK_FORMATS[chunk_format]
+    ffmpeg_command += ['-f', 'segment', '-reset_timestamps', '1',
+                       '-segment_list', segment_list, '-segment_list_type', 'csv']
+    if cuts:
+        ffmpeg_command += ['-segment_times', ','.join(f"{cut:.3f}" for cut in cuts)]
+    else:
+        # A single chunk covering the whole recording
+        ffmpeg_command += ['-segment_time', '1000000000']
+    ffmpeg_command.append(chunk_pattern)
+
+    process = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+
+    if process.returncode != 0:
+        print(f"Error writing chunks for {audio_file}:")
+        print(stderr.decode())
+        return None
+
+    chunks = []
+    with open(segment_list, newline='') as f:
+        for index, row in enumerate(csv.reader(f)):
+            if len(row) < 3:
+                continue
+            chunks.append({
+                'index': index,
+                'file': row[0],
+                'start': float(row[1]),
+                'end': float(row[2]),
+            })
+    os.remove(segment_list)
+    return chunks
+
+def chunk_recording(audio_file, output_directory, track=1, max_chunk=300.0, min_chunk=30.0,
+                    noise_db=-35, min_silence=0.5, chunk_format='wav'):
+    duration = get_duration(audio_file)
+    if duration is None:
+        print(f"Failed to determine the duration of {audio_file}.")
+        return None
+
+    silences = detect_silences(audio_file, track, noise_db, min_silence)
+    if silences is None:
+        return None
+
+    os.makedirs(output_directory, exist_ok=True)
+    cuts = choose_cut_points(silences, duration, max_chunk, min_chunk)
+    chunks = write_chunks(audio_file, output_directory, cuts, track, chunk_format)
+    if chunks is None:
+        return None
+
+    manifest = {
+        'source': os.path.abspath(audio_file),
+        'track': track,
+        'duration': duration,
+        'sample_rate': 16000,
+        'chunks': chunks,
+    }
+    base_name = os.path.splitext(os.path.basename(audio_file))[0]
+    manifest_file = os.path.join(output_directory, f"{base_name}_chunks.json")
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    hard_cuts = sum(1 for cut in cuts if not any(start <= cut <= end for start, end in silences))
+    print(f"Wrote {len(chunks)} chunk(s) for {audio_file} ({len(silences)} silences found, "
+          f"{hard_cuts} cut(s) outside silence) -> {manifest_file}")
+    return manifest_file
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Cut a recording into chunks at silence boundaries.")
+    parser.add_argument('audio_file', help="Recording or extracted audio track to chunk")
+    parser.add_argument('-o', '--output-directory', default='.', help="Destination directory for chunks and manifest")
+    parser.add_argument('--track', type=int, default=1, help="Audio track to chunk (numbered from 1)")
+    parser.add_argument('--max-chunk', type=float, default=300.0, help="Longest chunk in seconds")
+    parser.add_argument('--min-chunk', type=float, default=30.0, help="Shortest chunk a silence cut may produce")
+    parser.add_argument('--noise', type=float, default=-35, help="Silence threshold in dB")
+    parser.add_argument('--min-silence', type=float, default=0.5, help="Shortest silence, in seconds, to cut at")
+    parser.add_argument('-f', '--format', choices=sorted(CHUNK_FORMATS), default='wav', help="Chunk file format")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    manifest_file = chunk_recording(args.audio_file, args.output_directory, args.track, args.max_chunk,
+                                    args.min_chunk, args.noise, args.min_silence, args.format)
+    sys.exit(0 if manifest_file else 1)
@@ -1,82 +1,323 @@
 import subprocess
 import json
 import os
+import re
+import sys
+import glob
+import time
+import argparse
+import threading
+import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # This script is designed to grab any compatible video file and to split out the audio
 # as a separate track.  It allows the user to define the input file and output file.
 # It also allows you to split out both the video and audio or just return the audio.
+#
+# All tracks are pulled out in a single ffmpeg pass, so the container is only read and
+# demuxed once no matter how many audio tracks the recording has.
+#
+# Run it with no arguments for the interactive single-file flow below, or pass
+# directories / globs to process a whole event's worth of recordings in parallel:
+#   python "audio-video-filesplit-plus-diagnostics(007).py" "recordings/*.mp4" -o out --mode audio
+#
+# With --stream a single track is written to stdout as raw float32 16 kHz mono PCM
+# instead of to a file, so it can be piped straight into Step 2 without touching disk:
+#   python "audio-video-filesplit-plus-diagnostics(007).py" panel.mp4 --stream --track 1 | python transcribe.py -
+#
+# ffprobe results are kept in a JSON cache (by default .ffprobe_cache.json in the output
+# directory) keyed by path, size and modification time, and outputs that already exist
+# and are newer than their source are skipped.  Re-running over a large archive only
+# probes and splits the new or changed files.  Use --force to regenerate everything.
+# ffmpeg writes each output to a .part file that is renamed into place only once it
+# exits cleanly, so a failed or interrupted run never leaves a truncated file that a
+# later run would take for a finished one.
+#
+# While ffmpeg runs, its -progress output is read line by line to report how far each
+# file has got and how fast it is going (x realtime).  Every job also appends a JSON
+# timing record to split_metrics.jsonl in the output directory (see --metrics).
 
+# Extensions picked up when a directory is given in batch mode
+MEDIA_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.m4v', '.avi', '.webm', '.m4a', '.mp3', '.wav', '.aac')
 
-def get_audio_tracks_count(video_file):
-    # Run ffprobe command to get JSON output with audio stream information
-    ffprobe_command = ['ffprobe', '-v', 'error', '-select_streams', 'a:0', '-show_entries', 'stream=index', '-of', 'json', video_file]
+# Names this script writes itself: finished tracks and interrupted .part files.  They are
+# skipped when a directory is expanded, so splitting into the input directory and then
+# running again does not split the outputs.
+GENERATED_NAME = re.compile(r'(_output_(audio|video)_track_\d+|\.part)\.[^.]+$')
+
+# Audio output strategies:
+#   mp3  - re-encode to mp3 (the original behaviour)
+#   copy - remux the source audio untouched, for archiving; no decode or encode at all
+#   wav  - 16 kHz mono PCM, the exact format Whisper resamples everything to anyway
+#   flac - the same 16 kHz mono audio, losslessly compressed to save disk
+OUTPUT_FORMATS = ('mp3', 'copy', 'wav', 'flac')
+
+PROBE_CACHE_FILENAME = '.ffprobe_cache.json'
+METRICS_FILENAME = 'split_metrics.jsonl'
+
+# Seconds between progress lines for a single file
+PROGRESS_INTERVAL = 10
+
+# Stream layouts keyed by absolute path; shared by the batch worker threads
+PROBE_CACHE = {}
+PROBE_CACHE_LOCK = threading.Lock()
+
+# Container to use for each source codec when stream copying; anything else goes to .mka
+COPY_EXTENSIONS = {
+    'aac': 'm4a',
+    'alac': 'm4a',
+    'mp3': 'mp3',
+    'opus': 'opus',
+    'vorbis': 'ogg',
+    'flac': 'flac',
+    'ac3': 'ac3',
+    'eac3': 'eac3',
+}
+
+# PCM flavours the WAV muxer can hold as they are.  WAV is little-endian only, so
+# big-endian PCM (pcm_s16be, pcm_s24be, ...) falls through to Matroska instead.
+WAV_PCM_CODECS = {'pcm_u8', 'pcm_s16le', 'pcm_s24le', 'pcm_s32le', 'pcm_s64le', 'pcm_f32le', 'pcm_f64le',
+                  'pcm_alaw', 'pcm_mulaw'}
+
+
+def load_probe_cache(cache_file):
+    if not os.path.isfile(cache_file):
+        return
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print(f"Ignoring unreadable probe cache {cache_file}")
+        return
+    with PROBE_CACHE_LOCK:
+        PROBE_CACHE.update(cached)
+
+def save_probe_cache(cache_file):
+    # Write to a temporary file first so an interrupted run never leaves a truncated cache
+    with PROBE_CACHE_LOCK:
+        snapshot = dict(PROBE_CACHE)
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(snapshot, f, indent=1, sort_keys=True)
+    os.replace(temp_file, cache_file)
+
+def get_stream_layout(video_file):
+    # Reuse the cached layout while the file's size and modification time are unchanged
+    key = os.path.abspath(video_file)
+    try:
+        stat = os.stat(video_file)
+    except OSError as e:
+        print(f"Error reading {video_file}: {e}")
+        return None
+    with PROBE_CACHE_LOCK:
+        entry = PROBE_CACHE.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return entry['layout']
+
+    layout = probe_stream_layout(video_file)
+    if layout is not None:
+        with PROBE_CACHE_LOCK:
+            PROBE_CACHE[key] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'layout': layout}
+    return layout
+
+def probe_stream_layout(video_file):
+    # Run ffprobe command to get JSON output with every stream in the container
+    ffprobe_command = ['ffprobe', '-v', 'error', '-show_entries', 'stream=index,codec_type,codec_name:format=duration', '-of', 'json', video_file]
     process = subprocess.Popen(ffprobe_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     stdout, stderr = process.communicate()
 
-    if stderr:
+    # Warnings on stderr do not mean the probe failed; the exit status does
+    if process.returncode != 0:
         print("Error running ffprobe command:")
         print(stderr.decode())
         return None
 
-    # Parse JSON output to extract audio tracks count
+    # Parse JSON output and group the streams by type
     try:
         ffprobe_output = json.loads(stdout.decode())
-        audio_tracks_count = len(ffprobe_output['streams'])
-        return audio_tracks_count
-    except (json.JSONDecodeError, KeyError):
+        layout = {'audio': [], 'video': []}
+        for stream in ffprobe_output['streams']:
+            if stream.get('codec_type') in layout:
+                layout[stream['codec_type']].append(stream)
+        duration = ffprobe_output.get('format', {}).get('duration')
+        layout['duration'] = float(duration) if duration else None
+        return layout
+    except (json.JSONDecodeError, KeyError, ValueError):
         print("Error parsing ffprobe output.")
         return None
 
-def split_audio_only(video_file, output_directory):
-    # Get the base name of the input video file
-    base_name = os.path.splitext(os.path.basename(video_file))[0]
+def get_audio_tracks_count(video_file):
+    # Count every audio stream, not just the first one (a:0)
+    layout = get_stream_layout(video_file)
+    if layout is None:
+        return None
+    return len(layout['audio'])
 
-    # Get the number of audio tracks in the video file
-    audio_tracks_count = get_audio_tracks_count(video_file)
+def audio_output_options(stream, output_format):
+    # Pick the file extension and ffmpeg codec options for one audio stream
+    if output_format == 'copy':
+        codec_name = stream.get('codec_name', '')
+        if codec_name in WAV_PCM_CODECS:
+            return 'wav', ['-c:a', 'copy']
+        return COPY_EXTENSIONS.get(codec_name, 'mka'), ['-c:a', 'copy']
+    if output_format == 'wav':
+        return 'wav', ['-ac', '1', '-ar', '16000', '-c:a', 'pcm_s16le']
+    if output_format == 'flac':
+        return 'flac', ['-ac', '1', '-ar', '16000', '-c:a', 'flac']
+    return 'mp3', []
 
-    if audio_tracks_count is None:
-        print("Failed to determine the number of audio tracks.")
-        return
+def is_up_to_date(output_file, source_mtime):
+    try:
+        stat = os.stat(output_file)
+    except OSError:
+        return False
+    return stat.st_size > 0 and stat.st_mtime >= source_mtime
 
-    # Run ffmpeg command to extract audio tracks only
-    for track_index in range(audio_tracks_count):
-        output_audio_file = os.path.join(output_directory, f"{base_name}_output_audio_track_{track_index + 1}.mp3")
+def part_path(output_file):
+    # ffmpeg picks the muxer from the extension, so .part goes before it
+    stem, extension = os.path.splitext(output_file)
+    return f"{stem}.part{extension}"
 
-        ffmpeg_command = ['ffmpeg', '-i', video_file, '-map', f'0:a:{track_index}', '-vn', output_audio_file]
-        process = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
+def parse_speed(value):
+    # ffmpeg reports speed as e.g. "37.5x", or "N/A" before the first frame
+    try:
+        return float(value.rstrip('x'))
+    except ValueError:
+        return None
 
-        if stderr:
-            print(f"Error splitting audio track {track_index + 1}:")
-            print(stderr.decode())
-        else:
-            print(f"Audio track {track_index + 1} split successfully.")
+def run_ffmpeg_with_progress(ffmpeg_command, duration, label):
+    # -progress writes key=value blocks to stdout as it goes.  stderr is drained on a
+    # separate thread so a chatty ffmpeg can never block on a full pipe.
+    process = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    stderr_tail = deque(maxlen=20)
+    stderr_reader = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+    stderr_reader.start()
 
-def split_audio_and_video(video_file, output_directory):
+    speed = None
+    out_seconds = 0.0
+    last_report = time.time()
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        if key == 'out_time_us' and value.isdigit():
+            out_seconds = int(value) / 1000000
+        elif key == 'speed':
+            speed = parse_speed(value) or speed
+        elif key == 'progress':
+            now = time.time()
+            if value == 'end' or now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                done = f"{100 * out_seconds / duration:5.1f}%" if duration else f"{out_seconds:.0f}s"
+                rate = f"{speed:.1f}x realtime" if speed else "speed n/a"
+                print(f"[{label}] {done}  {rate}")
+
+    process.wait()
+    stderr_reader.join()
+    return process.returncode, [line.rstrip() for line in stderr_tail if line.strip()], speed
+
+def extract_tracks(video_file, output_directory, include_video=False, tracks=None, output_format='mp3', force=False):
     # Get the base name of the input video file
     base_name = os.path.splitext(os.path.basename(video_file))[0]
 
-    # Get the number of audio tracks in the video file
-    audio_tracks_count = get_audio_tracks_count(video_file)
-
-    if audio_tracks_count is None:
+    layout = get_stream_layout(video_file)
+    if layout is None:
         print("Failed to determine the number of audio tracks.")
-        return
+        return {'file': video_file, 'status': 'failed', 'tracks': [], 'error': 'ffprobe failed'}
 
-    # Run ffmpeg command to split audio and video tracks
-    for track_index in range(audio_tracks_count):
-        output_video_file = os.path.join(output_directory, f"{base_name}_output_video_track_{track_index + 1}.mp4")
-        output_audio_file = os.path.join(output_directory, f"{base_name}_output_audio_track_{track_index + 1}.mp3")
+    # Tracks are numbered from 1 to match the output file names
+    audio_tracks_count = len(layout['audio'])
+    if tracks is None:
+        tracks = range(1, audio_tracks_count + 1)
+    tracks = [track for track in tracks if 1 <= track <= audio_tracks_count]
+    if not tracks:
+        print("No audio tracks to extract.")
+        return {'file': video_file, 'status': 'failed', 'tracks': [], 'error': 'no audio tracks'}
 
-        ffmpeg_command = ['ffmpeg', '-i', video_file, '-map', f'0:a:{track_index}', '-vn', output_audio_file, '-map', '0:v', output_video_file]
-        process = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
+    # Only outputs that are missing or older than the source need to be written
+    source_mtime = os.path.getmtime(video_file)
+    outputs = []
+    for track in tracks:
+        extension, codec_options = audio_output_options(layout['audio'][track - 1], output_format)
+        output_audio_file = os.path.join(output_directory, f"{base_name}_output_audio_track_{track}.{extension}")
+        outputs.append(['-map', f'0:a:{track - 1}', '-vn'] + codec_options + [output_audio_file])
+    if include_video:
+        # When archiving, keep the video bitstream as-is instead of re-encoding it too
+        video_options = ['-c:v', 'copy'] if output_format == 'copy' else []
+        for video_index in range(len(layout['video'])):
+            output_video_file = os.path.join(output_directory, f"{base_name}_output_video_track_{video_index + 1}.mp4")
+            outputs.append(['-map', f'0:v:{video_index}', '-an'] + video_options + [output_video_file])
+    if not force:
+        outputs = [output for output in outputs if not is_up_to_date(output[-1], source_mtime)]
+        if not outputs:
+            print(f"All outputs for {video_file} are up to date; skipping.")
+            return {'file': video_file, 'status': 'skipped', 'tracks': tracks, 'error': ''}
 
-        if stderr:
-            print(f"Error splitting track {track_index + 1}:")
-            print(stderr.decode())
-        else:
-            print(f"Track {track_index + 1} split successfully.")
+    # Build one ffmpeg command with an output per track so the input is demuxed once.
+    # -nostdin/-y keep ffmpeg from stopping to ask about existing outputs in batch runs.
+    ffmpeg_command = ['ffmpeg', '-nostdin', '-y', '-hide_banner', '-loglevel', 'error',
+                      '-progress', 'pipe:1', '-nostats', '-i', video_file]
+    for output in outputs:
+        ffmpeg_command += output[:-1] + [part_path(output[-1])]
+
+    # Success is decided by the exit code; ffmpeg writes to stderr even when it works.
+    # Only a clean exit moves the outputs into place; anything else discards them.
+    start = time.time()
+    returncode = None
+    try:
+        returncode, stderr_lines, speed = run_ffmpeg_with_progress(ffmpeg_command, layout.get('duration'), base_name)
+        if returncode == 0:
+            for output in outputs:
+                os.replace(part_path(output[-1]), output[-1])
+    finally:
+        if returncode != 0:
+            for output in outputs:
+                if os.path.exists(part_path(output[-1])):
+                    os.remove(part_path(output[-1]))
+    elapsed = time.time() - start
+
+    duration = layout.get('duration')
+    metrics = {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'file': video_file,
+        'status': 'success' if returncode == 0 else 'failed',
+        'returncode': returncode,
+        'output_format': output_format,
+        'include_video': include_video,
+        'tracks': len(tracks),
+        'outputs': len(outputs),
+        'audio_codecs': sorted({layout['audio'][track - 1].get('codec_name', 'unknown') for track in tracks}),
+        'media_seconds': duration,
+        'wall_seconds': round(elapsed, 3),
+        'realtime_factor': round(duration / elapsed, 2) if returncode == 0 and duration and elapsed > 0 else None,
+        'ffmpeg_speed': speed,
+    }
+
+    if returncode != 0:
+        print(f"Error splitting tracks {', '.join(str(track) for track in tracks)} of {video_file}:")
+        print('\n'.join(stderr_lines))
+        return {'file': video_file, 'status': 'failed', 'tracks': tracks, 'seconds': elapsed, 'metrics': metrics,
+                'error': stderr_lines[-1] if stderr_lines else f"ffmpeg exited with {returncode}"}
+
+    for track in tracks:
+        print(f"Track {track} of {video_file} split successfully.")
+    return {'file': video_file, 'status': 'success', 'tracks': tracks, 'seconds': elapsed, 'metrics': metrics,
+            'error': ''}
+
+def split_file(video_file, output_directory, include_video=False, output_format='mp3', force=False,
+               cache_file=None, metrics_file=None):
+    # One file outside a batch, with the same probe cache and timing records
+    cache_file, metrics_file = prepare_output_directory(output_directory, cache_file, metrics_file)
+    result = extract_tracks(video_file, output_directory, include_video, None, output_format, force)
+    if 'metrics' in result:
+        write_metrics(metrics_file, result['metrics'])
+    save_probe_cache(cache_file)
+    return result
+
+def split_audio_only(video_file, output_directory):
+    return split_file(video_file, output_directory)
+
+def split_audio_and_video(video_file, output_directory):
+    return split_file(video_file, output_directory, include_video=True)
 
 def split_video_into_tracks(video_file, output_directory):
     choice = input("Enter 'audio' to split audio tracks only, or 'both' to split both audio and video tracks: ").lower()
@@ -88,8 +329,125 @@ def split_video_into_tracks(video_file, output_directory):
     else:
         print("Invalid choice. Please enter 'audio' or 'both'.")
 
-# Example usage
-video_file_path = 'path-to-file.mp4'
-output_directory = 'directory-path'
+def stream_track_pcm(video_file, track=1):
+    # ffmpeg writes the decoded samples to our stdout; its own messages go to stderr
+    # so nothing but audio ever reaches the pipe
+    ffmpeg_command = ['ffmpeg', '-nostdin', '-v', 'error', '-i', video_file,
+                      '-map', f'0:a:{track - 1}', '-vn', '-ac', '1', '-ar', '16000',
+                      '-f', 'f32le', '-c:a', 'pcm_f32le', 'pipe:1']
+    process = subprocess.run(ffmpeg_command, stdout=sys.stdout.buffer)
+    if process.returncode != 0:
+        print(f"Error streaming audio track {track} of {video_file}", file=sys.stderr)
+    return process.returncode
+
+def collect_input_files(inputs):
+    # Expand directories and glob patterns into a sorted, de-duplicated job list
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                path = os.path.join(item, name)
+                if (os.path.isfile(path) and name.lower().endswith(MEDIA_EXTENSIONS)
+                        and not GENERATED_NAME.search(name)):
+                    files.append(path)
+        else:
+            matches = sorted(glob.glob(item))
+            if not matches:
+                print(f"Warning: no files matched {item}")
+            files.extend(path for path in matches if os.path.isfile(path))
+    seen = set()
+    return [path for path in files if not (path in seen or seen.add(path))]
+
+def prepare_output_directory(output_directory, cache_file=None, metrics_file=None):
+    # Creates the output directory, loads the probe cache and resolves where the cache
+    # and the timing records go (both default to the output directory)
+    os.makedirs(output_directory, exist_ok=True)
+    cache_file = cache_file or os.path.join(output_directory, PROBE_CACHE_FILENAME)
+    load_probe_cache(cache_file)
+    metrics_file = metrics_file or os.path.join(output_directory, METRICS_FILENAME)
+    return cache_file, metrics_file
+
+def write_metrics(metrics_file, metrics):
+    with open(metrics_file, 'a') as f:
+        f.write(json.dumps(metrics) + '\n')
+
+def run_batch(inputs, output_directory, mode='audio', max_workers=None, output_format='mp3',
+              force=False, cache_file=None, metrics_file=None):
+    video_files = collect_input_files(inputs)
+    if not video_files:
+        print("No input files found.")
+        return []
+    cache_file, metrics_file = prepare_output_directory(output_directory, cache_file, metrics_file)
+
+    # Each job is an ffmpeg process; the threads here only wait on them, so the pool
+    # size bounds how many ffmpeg processes run at once.
+    max_workers = max_workers or os.cpu_count() or 1
+    max_workers = min(max_workers, len(video_files))
+    print(f"Processing {len(video_files)} file(s) with {max_workers} parallel job(s)")
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(extract_tracks, video_file, output_directory, mode == 'both', None, output_format, force): video_file
+            for video_file in video_files
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                results.append(result)
+                if 'metrics' in result:
+                    write_metrics(metrics_file, result['metrics'])
+            except Exception as e:
+                results.append({'file': futures[future], 'status': 'failed', 'tracks': [], 'error': str(e)})
+
+    save_probe_cache(cache_file)
+    print_batch_summary(results)
+    return results
+
+def print_batch_summary(results):
+    print("\n==== Batch summary")
+    for result in sorted(results, key=lambda r: r['file']):
+        tracks = ','.join(str(track) for track in result.get('tracks', [])) or '-'
+        seconds = f"{result['seconds']:.1f}s" if 'seconds' in result else '-'
+        realtime = result.get('metrics', {}).get('realtime_factor')
+        realtime = f"{realtime:.1f}x" if realtime else '-'
+        line = f"{result['status']:<8} {seconds:>8} {realtime:>8}  tracks {tracks:<8} {result['file']}"
+        if result.get('error'):
+            line += f"  ({result['error']})"
+        print(line)
+    num_failed = sum(1 for r in results if r['status'] == 'failed')
+    num_skipped = sum(1 for r in results if r['status'] == 'skipped')
+    print(f"{len(results) - num_failed - num_skipped} succeeded, {num_skipped} up to date, {num_failed} failed")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Split audio (and optionally video) tracks out of recordings.")
+    parser.add_argument('inputs', nargs='+', help="Files, directories or glob patterns to process")
+    parser.add_argument('-o', '--output-directory', default='.', help="Destination directory for output files")
+    parser.add_argument('--mode', choices=['audio', 'both'], default='audio', help="Split audio tracks only, or audio and video")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='mp3',
+                        help="Audio output: mp3, copy (remux source audio), wav/flac (16 kHz mono for Whisper)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Write one track to stdout as float32 16 kHz mono PCM for transcribe.py")
+    parser.add_argument('--track', type=int, default=1, help="Audio track to stream (numbered from 1)")
+    parser.add_argument('--force', action='store_true', help="Regenerate outputs even when they are up to date")
+    parser.add_argument('--cache', default=None,
+                        help=f"ffprobe cache file (default: {PROBE_CACHE_FILENAME} in the output directory)")
+    parser.add_argument('--metrics', default=None,
+                        help=f"JSON lines file for per-job timing records (default: {METRICS_FILENAME} in the output directory)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="Parallel ffmpeg jobs (default: number of CPU cores)")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        args = parse_args(sys.argv[1:])
+        if args.stream:
+            sys.exit(stream_track_pcm(args.inputs[0], args.track))
+        results = run_batch(args.inputs, args.output_directory, args.mode, args.jobs, args.format,
+                            args.force, args.cache, args.metrics)
+        sys.exit(1 if any(r['status'] == 'failed' for r in results) or not results else 0)
+
+    # Example usage
+    video_file_path = 'path-to-file.mp4'
+    output_directory = 'directory-path'
 
-split_video_into_tracks(video_file_path, output_directory)
+    split_video_into_tracks(video_file_path, output_directory)
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import transcribe_batched
+from checks import check, finish
+
+# Turning a batched decode's tokens into segments: timestamp tokens open and close each
+# segment, and times are moved by the window's offset into the recording.  The
+# tokenizer and decoding result are stand-ins, so no model is loaded.
+#   python batched_segments_test.py
+
+EOT = 50257
+TIMESTAMP_BEGIN = 50364
+
+
+def timestamp(seconds):
+    return TIMESTAMP_BEGIN + round(seconds / transcribe_batched.TIME_PRECISION)
+
+def main():
+    tokenizer = SimpleNamespace(eot=EOT, timestamp_begin=TIMESTAMP_BEGIN,
+                                decode=lambda tokens: "".join(f" w{token}" for token in tokens))
+    decoding_result = SimpleNamespace(temperature=0.0, avg_logprob=-0.3, compression_ratio=1.4, no_speech_prob=0.02)
+
+    def segments(tokens, offset=30.0, window_seconds=30.0):
+        return transcribe_batched.tokens_to_segments(tokens, tokenizer, offset, window_seconds, decoding_result)
+
+    result = segments([timestamp(0.0), 1, 2, timestamp(2.4), timestamp(2.4), 3, timestamp(5.0), EOT])
+    ok = check("each timestamp pair becomes a segment, offset into the recording",
+               [(s["start"], s["end"], s["tokens"]) for s in result] == [(30.0, 32.4, [1, 2]), (32.4, 35.0, [3])])
+    ok &= check("text, window position and decode scores are carried over",
+                result[0]["text"] == " w1 w2" and result[0]["seek"] == 3000
+                and result[0]["avg_logprob"] == -0.3 and result[1]["no_speech_prob"] == 0.02)
+
+    result = segments([timestamp(0.0), 1, 2, timestamp(3.0), timestamp(3.0), 4, 5], window_seconds=8.0)
+    ok &= check("text left open at the end of the window runs to the window's end",
+                [(s["start"], s["end"]) for s in result] == [(30.0, 33.0), (33.0, 38.0)])
+
+    result = segments([timestamp(6.0), 7, timestamp(12.0)], offset=0.0, window_seconds=10.0)
+    ok &= check("an end past a short window is clamped to the window",
+                [(s["start"], s["end"]) for s in result] == [(6.0, 10.0)])
+
+    result = segments([EOT + 1, timestamp(1.0), 8, EOT + 5, 9, timestamp(2.0), EOT])
+    ok &= check("special tokens are left out of the text",
+                [s["tokens"] for s in result] == [[8, 9]])
+
+    ok &= check("a window with no text gives no segments",
+                segments([timestamp(0.0), timestamp(30.0), EOT]) == [])
+
+    return finish(ok)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,284 @@
+import os
+import re
+import sys
+import csv
+import json
+import time
+import gc
+import argparse
+import itertools
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Benchmarks Whisper model sizes and decode settings on a fixed set of recordings and
+# scores each run against the checked-in reference transcripts in "Audio Transcripts".
+#
+# For every configuration it reports:
+#   rtf      - real-time factor, transcription wall time / audio duration (lower is faster)
+#   model_rss - resident memory once the model is loaded and garbage collected
+#   peak_rss - peak resident memory of the process that loaded the model and transcribed
+#   wer      - word error rate against the reference, after Whisper's English normalizer
+#
+# Precision "int8" runs the model with its linear layers dynamically quantized; when
+# int8 and fp32 runs of the same settings are both present, a comparison of speedup,
+# memory saving and WER drift is printed, checked against --max-wer-drift.  The memory
+# saving is scored on model_rss: the peak also covers loading the fp32 checkpoint that
+# int8 starts from, so it barely moves.
+#
+# The references were produced with the `large` model, so WER here measures how far a
+# cheaper configuration drifts from what we have been publishing, not absolute accuracy.
+#
+# Audio is matched to references by name: a file in --audio-dir whose name starts with
+# "Panel N" is scored against "Panel N_transcription.txt".
+#
+#   python benchmark_models.py --audio-dir recordings --models tiny base small --beam-size 1 5 --max-wer 0.15
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERENCE_DIRECTORY = os.path.join(REPOSITORY_ROOT, "Audio Transcripts")
+REFERENCE_SUFFIX = "_transcription.txt"
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".m4a", ".mp4", ".ogg", ".opus", ".mka")
+
+MODELS = ["tiny", "base", "small", "medium", "large"]
+TEMPERATURE_FALLBACK = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+
+def load_references(reference_directory=REFERENCE_DIRECTORY):
+    references = {}
+    for name in sorted(os.listdir(reference_directory)):
+        if name.endswith(REFERENCE_SUFFIX):
+            with open(os.path.join(reference_directory, name)) as f:
+                references[name[:-len(REFERENCE_SUFFIX)]] = f.read()
+    return references
+
+def match_audio_files(audio_directory, references):
+    # "Panel 1" must not also match "Panel 10", so the prefix has to end at a non-digit
+    audio_files = {}
+    names = sorted(name for name in os.listdir(audio_directory) if name.lower().endswith(AUDIO_EXTENSIONS))
+    for key in references:
+        pattern = re.compile(re.escape(key) + r"(?!\d)")
+        matches = [name for name in names if pattern.match(name)]
+        if matches:
+            audio_files[key] = os.path.join(audio_directory, matches[0])
+    return audio_files
+
+def normalize_words(text):
+    from whisper.normalizers import EnglishTextNormalizer
+    return EnglishTextNormalizer()(text).split()
+
+def word_error_rate(reference, hypothesis):
+    # Word-level Levenshtein distance / reference length.  Each row of the edit-distance
+    # table is computed with array operations; insertions along a row are resolved with
+    # a running minimum, using row[j] = min_k (base[k] + j - k).
+    reference_words = normalize_words(reference)
+    hypothesis_words = normalize_words(hypothesis)
+    if not reference_words:
+        return 0.0 if not hypothesis_words else 1.0
+
+    vocabulary = {word: index for index, word in enumerate(set(reference_words) | set(hypothesis_words))}
+    reference_ids = np.array([vocabulary[word] for word in reference_words])
+    columns = np.arange(len(reference_ids) + 1)
+    row = columns.copy()
+    for word in hypothesis_words:
+        substitution = row[:-1] + (reference_ids != vocabulary[word])
+        base = np.empty_like(row)
+        base[0] = row[0] + 1
+        base[1:] = np.minimum(row[1:] + 1, substitution)
+        row = np.minimum.accumulate(base - columns) + columns
+    return float(row[-1]) / len(reference_ids)
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def current_rss_mb():
+    # Steady-state resident memory after a collection; /proc only exists on Linux, so
+    # elsewhere this falls back to the peak
+    gc.collect()
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return peak_rss_mb()
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+def config_label(config):
+    label = f"{config['model']} beam={config['beam_size'] or 'greedy'}"
+    label += " fallback" if config["fallback"] else " t=0"
+    label += f" {config['precision']}"
+    return label
+
+def decode_options(config):
+    options = {
+        "temperature": TEMPERATURE_FALLBACK if config["fallback"] else 0.0,
+        "fp16": config["precision"] == "fp16",
+    }
+    if config["beam_size"]:
+        options["beam_size"] = config["beam_size"]
+        if config["fallback"]:
+            # Sampled fallback temperatures draw best_of candidates, as in whisper's CLI
+            options["best_of"] = config["beam_size"]
+    return options
+
+def load_benchmark_model(config):
+    import transcribe
+    return transcribe.load_model(config["model"], int8=config["precision"] == "int8")
+
+def run_config(config, audio_files):
+    # Runs in a fresh process so the peak RSS belongs to this configuration alone
+    import torch
+    import whisper
+
+    if config.get("threads"):
+        torch.set_num_threads(config["threads"])
+    load_start = time.time()
+    model = load_benchmark_model(config)
+    load_seconds = time.time() - load_start
+    model_rss_mb = current_rss_mb()
+
+    runs = []
+    for key, audio_path in audio_files.items():
+        audio = whisper.load_audio(audio_path)
+        start = time.time()
+        result = model.transcribe(audio, **decode_options(config))
+        runs.append({
+            "key": key,
+            "audio_seconds": len(audio) / whisper.audio.SAMPLE_RATE,
+            "wall_seconds": time.time() - start,
+            "text": result["text"],
+        })
+    return {"load_seconds": load_seconds, "model_rss_mb": model_rss_mb, "peak_rss_mb": peak_rss_mb(), "runs": runs}
+
+def benchmark(configs, audio_files, references):
+    rows = []
+    spawn = multiprocessing.get_context("spawn")
+    for config in configs:
+        label = config_label(config)
+        print(f"Running {label} on {len(audio_files)} file(s)...", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            try:
+                outcome = executor.submit(run_config, config, audio_files).result()
+            except Exception as e:
+                print(f"  {label} failed: {e}", file=sys.stderr)
+                continue
+
+        audio_seconds = sum(run["audio_seconds"] for run in outcome["runs"])
+        wall_seconds = sum(run["wall_seconds"] for run in outcome["runs"])
+        wers = [word_error_rate(references[run["key"]], run["text"]) for run in outcome["runs"]]
+        rows.append({
+            "config": label,
+            **config,
+            "files": len(outcome["runs"]),
+            "audio_seconds": round(audio_seconds, 1),
+            "wall_seconds": round(wall_seconds, 1),
+            "rtf": round(wall_seconds / audio_seconds, 3) if audio_seconds else None,
+            "load_seconds": round(outcome["load_seconds"], 1),
+            "model_rss_mb": round(outcome["model_rss_mb"]),
+            "peak_rss_mb": round(outcome["peak_rss_mb"]),
+            "wer": round(float(np.mean(wers)), 4) if wers else None,
+            "wer_per_file": {run["key"]: round(wer, 4) for run, wer in zip(outcome["runs"], wers)},
+        })
+        print(f"  rtf {rows[-1]['rtf']}  wer {rows[-1]['wer']}  model rss {rows[-1]['model_rss_mb']} MB  peak rss {rows[-1]['peak_rss_mb']} MB", file=sys.stderr)
+    return rows
+
+def measured(row):
+    # A run can finish without a usable rtf or wer, e.g. when every file was empty
+    return row["rtf"] is not None and row["wer"] is not None
+
+def print_table(rows, max_wer=None):
+    def cell(value):
+        return "n/a" if value is None else value
+
+    print(f"| {'config':<32} | {'rtf':>6} | {'wer':>6} | {'model rss MB':>12} | {'peak rss MB':>11} | {'load s':>6} |")
+    print(f"|{'-' * 34}|{'-' * 8}|{'-' * 8}|{'-' * 14}|{'-' * 13}|{'-' * 8}|")
+    for row in sorted(rows, key=lambda r: r["rtf"] or float("inf")):
+        print(f"| {row['config']:<32} | {cell(row['rtf']):>6} | {cell(row['wer']):>6} | {row['model_rss_mb']:>12} | {row['peak_rss_mb']:>11} | {row['load_seconds']:>6} |")
+
+    if max_wer is not None:
+        eligible = [row for row in rows if measured(row) and row["wer"] <= max_wer]
+        if eligible:
+            best = min(eligible, key=lambda r: r["rtf"])
+            print(f"\nFastest configuration with WER <= {max_wer}: {best['config']} (rtf {best['rtf']}, wer {best['wer']})")
+        else:
+            print(f"\nNo configuration met WER <= {max_wer}")
+
+def print_int8_comparison(rows, max_wer_drift):
+    settings = ("model", "beam_size", "fallback")
+    rows = [row for row in rows if measured(row)]
+    baselines = {tuple(row[key] for key in settings): row for row in rows if row["precision"] == "fp32"}
+    pairs = [(baselines.get(tuple(row[key] for key in settings)), row) for row in rows if row["precision"] == "int8"]
+    pairs = [(baseline, row) for baseline, row in pairs if baseline]
+    if not pairs:
+        return
+
+    print(f"\nint8 against fp32 (WER drift limit {max_wer_drift}):")
+    for baseline, row in pairs:
+        speedup = baseline["rtf"] / row["rtf"] if row["rtf"] else float("nan")
+        memory_saving = 1 - row["model_rss_mb"] / baseline["model_rss_mb"]
+        drift = row["wer"] - baseline["wer"]
+        verdict = "ok" if drift <= max_wer_drift else "EXCEEDS LIMIT"
+        print(f"  {row['config']:<32} {speedup:.2f}x faster, {100 * memory_saving:.0f}% less memory, "
+              f"WER drift {drift:+.4f}  {verdict}")
+
+def write_results(rows, output_path):
+    if output_path.endswith(".json"):
+        with open(output_path, "w") as f:
+            json.dump(rows, f, indent=2)
+        return
+    fieldnames = [key for key in rows[0] if key != "wer_per_file"]
+    with open(output_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+def build_configs(args):
+    return [
+        {"model": model, "beam_size": beam_size, "fallback": fallback, "precision": precision, "threads": args.threads}
+        for model, beam_size, fallback, precision in itertools.product(args.models, args.beam_size, args.fallback,
+                                                                       args.precision)
+    ]
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark Whisper models and decode options against reference transcripts.")
+    parser.add_argument("--audio-dir", required=True, help="Directory with the benchmark recordings (named 'Panel N...')")
+    parser.add_argument("--references", default=REFERENCE_DIRECTORY, help="Directory of *_transcription.txt references")
+    parser.add_argument("--panels", nargs="*", default=None, help="Only use these references, e.g. 'Panel 1' 'Panel 3'")
+    parser.add_argument("--models", nargs="+", default=MODELS, help="Whisper models to compare")
+    parser.add_argument("--beam-size", nargs="+", type=int, default=[0, 5], help="Beam sizes; 0 means greedy decoding")
+    parser.add_argument("--fallback", nargs="+", type=lambda v: v.lower() in ("1", "true", "yes", "on"),
+                        default=[True, False], help="Whether to use the temperature fallback ladder (true/false)")
+    parser.add_argument("--precision", nargs="+", choices=["fp32", "fp16", "int8"], default=["fp32"],
+                        help="Inference precision; fp16 needs a GPU, int8 is dynamic quantization on CPU")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per run (default: torch's choice)")
+    parser.add_argument("--max-wer", type=float, default=None, help="Accuracy bar for picking the fastest configuration")
+    parser.add_argument("--max-wer-drift", type=float, default=0.02, help="Largest acceptable WER increase for int8")
+    parser.add_argument("-o", "--output", default=None, help="Also write results to a .csv or .json file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    references = load_references(args.references)
+    if args.panels:
+        references = {key: text for key, text in references.items() if key in args.panels}
+    audio_files = match_audio_files(args.audio_dir, references)
+    missing = sorted(set(references) - set(audio_files))
+    if missing:
+        print(f"No audio found for: {', '.join(missing)}", file=sys.stderr)
+    if not audio_files:
+        print("Nothing to benchmark.", file=sys.stderr)
+        return 1
+
+    rows = benchmark(build_configs(args), audio_files, references)
+    if not rows:
+        return 1
+    print_table(rows, args.max_wer)
+    print_int8_comparison(rows, args.max_wer_drift)
+    if args.output:
+        write_results(rows, args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
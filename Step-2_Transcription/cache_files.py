@@ -0,0 +1,37 @@
+import os
+
+# Size-limited directories of cache files, shared by transcript_cache and feature_cache.
+# Readers touch a file's modification time on every use, so sorting by it gives least
+# recently used first.  Entries are (mtime, size, path) for the files whose names end
+# in one of the given suffixes; anything else in the directory (stats, temporary files
+# being written) is neither counted nor removed.
+
+
+def list_entries(cache_directory, suffixes, exclude=()):
+    entries = []
+    for root, _, names in os.walk(cache_directory):
+        for name in names:
+            if name.endswith(suffixes) and name not in exclude:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+def evict(cache_directory, max_bytes, suffixes, exclude=()):
+    # Oldest access first until the cache fits; returns how many files were removed
+    entries = sorted(list_entries(cache_directory, suffixes, exclude))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+    return evicted
@@ -0,0 +1,12 @@
+# Reporting for the check scripts in this folder (*_test.py).  Each one builds its
+# input synthetically, so none needs a recording, and most need no model either:
+#   python vad_test.py
+
+
+def check(label, condition):
+    print(f"{'ok  ' if condition else 'FAIL'} {label}")
+    return condition
+
+def finish(ok):
+    print("All checks passed." if ok else "Some checks FAILED.")
+    return 0 if ok else 1
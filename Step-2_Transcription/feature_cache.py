@@ -0,0 +1,104 @@
+import os
+import hashlib
+
+import numpy as np
+import whisper
+from whisper.audio import N_FRAMES, log_mel_spectrogram, pad_or_trim
+
+import cache_files
+
+# A cache of decoded audio and log-mel windows kept as flat float32 files.  Decoding a
+# panel through ffmpeg takes seconds and every retry, cascade pass and parallel worker
+# used to repeat it; with the cache the first run writes the 16 kHz PCM once and later
+# runs open it with np.memmap.  Mapped files live in the page cache, so worker processes
+# reading the same recording share one copy of it instead of holding one each.
+#
+# Decoded audio is keyed by the source file's path, size and modification time, audio
+# from stdin by a hash of its samples.  Mel windows are keyed by the audio's key and the
+# window's sample range.  Files are opened copy-on-write, so callers may treat them as
+# ordinary arrays; nothing is ever written back.  Least recently used files are removed
+# once the cache grows past its size limit.
+
+CACHE_DIRECTORY = os.getenv("WHISPER_FEATURE_CACHE", os.path.expanduser("~/.cache/whisper-ai/features"))
+MAX_CACHE_BYTES = 20 * 1024 ** 3
+ENTRY_SUFFIXES = (".pcm", ".mel")
+
+
+def source_key(audio_path):
+    stat = os.stat(audio_path)
+    return hashlib.sha256(f"{os.path.abspath(audio_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+def audio_key(audio):
+    # Audio opened from the cache already carries its key in the file name
+    if isinstance(audio, np.memmap) and audio.filename:
+        return os.path.basename(audio.filename).split(".")[0]
+    return hashlib.sha256(np.ascontiguousarray(audio).tobytes()).hexdigest()
+
+def pcm_path(cache_directory, key):
+    return os.path.join(cache_directory, key[:2], key + ".pcm")
+
+def mel_path(cache_directory, key, start_sample, end_sample, n_mels):
+    return os.path.join(cache_directory, key[:2], f"{key}.{start_sample}-{end_sample}.{n_mels}.mel")
+
+def write_array(path, array):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + f".{os.getpid()}.tmp"
+    np.ascontiguousarray(array, dtype=np.float32).tofile(temp_path)
+    os.replace(temp_path, path)
+
+def open_pcm(path):
+    # np.memmap refuses empty files
+    os.utime(path)
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="c")
+
+def cached_audio(audio_path, cache_directory=CACHE_DIRECTORY, max_bytes=MAX_CACHE_BYTES):
+    path = pcm_path(cache_directory, source_key(audio_path))
+    if not os.path.exists(path):
+        write_array(path, whisper.load_audio(audio_path))
+        evict(cache_directory, max_bytes)
+    return open_pcm(path)
+
+def share_audio(audio, cache_directory=CACHE_DIRECTORY, max_bytes=MAX_CACHE_BYTES):
+    # Returns the path of a cache file holding this audio, writing it if needed, so
+    # other processes can map it instead of receiving a pickled copy
+    if isinstance(audio, np.memmap) and audio.filename and os.path.exists(audio.filename):
+        return audio.filename
+    path = pcm_path(cache_directory, audio_key(audio))
+    if not os.path.exists(path):
+        write_array(path, audio)
+        evict(cache_directory, max_bytes)
+    return path
+
+def cached_mel(audio, start_sample, end_sample, n_mels, cache_directory=CACHE_DIRECTORY, key=None,
+               max_bytes=MAX_CACHE_BYTES):
+    # One 30 second window as the model sees it, padded or trimmed to N_FRAMES
+    path = mel_path(cache_directory, key or audio_key(audio), start_sample, end_sample, n_mels)
+    if not os.path.exists(path):
+        mel = log_mel_spectrogram(pad_or_trim(np.asarray(audio[start_sample:end_sample])), n_mels)
+        write_array(path, mel.cpu().numpy())
+        evict(cache_directory, max_bytes)
+    os.utime(path)
+    return np.memmap(path, dtype=np.float32, mode="c", shape=(n_mels, N_FRAMES))
+
+def list_entries(cache_directory):
+    return cache_files.list_entries(cache_directory, ENTRY_SUFFIXES)
+
+def evict(cache_directory, max_bytes=MAX_CACHE_BYTES):
+    # Processes that still have an evicted file mapped keep reading it; the space is
+    # freed when they let go
+    return cache_files.evict(cache_directory, max_bytes, ENTRY_SUFFIXES)
+
+def add_cache_argument(parser, help_text="Reuse decoded audio from this directory"):
+    # The --feature-cache flag every Step 2 entry point takes; given without a
+    # directory it uses CACHE_DIRECTORY
+    parser.add_argument("--feature-cache", nargs="?", const=CACHE_DIRECTORY, default=None,
+                        help=help_text + " (default location if no directory is given)")
+
+def report(cache_directory):
+    entries = list_entries(cache_directory)
+    pcm = [size for _, size, path in entries if path.endswith(".pcm")]
+    mel = [size for _, size, path in entries if path.endswith(".mel")]
+    return (f"Feature cache {cache_directory}: {len(pcm)} decoded recording(s) ({sum(pcm) / 1024 ** 2:.0f} MB), "
+            f"{len(mel)} mel window(s) ({sum(mel) / 1024 ** 2:.0f} MB)")
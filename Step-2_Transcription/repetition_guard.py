@@ -0,0 +1,121 @@
+import time
+import contextlib
+
+from whisper.decoding import DecodingTask, LogitFilter
+from whisper.tokenizer import get_tokenizer
+
+# A guard against Whisper's repetition loops.  On music or crosstalk the decoder can
+# settle into the same short phrase and repeat it until the window's token limit, after
+# which transcribe() sees the high compression ratio and decodes the whole window again
+# at the next temperature, often with the same outcome.
+#
+# While the guard is active, every decode watches the text tokens it has produced so
+# far.  As soon as their tail is one n-gram repeated back to back (at least MIN_REPEATS
+# times and MIN_REPEATED_TOKENS tokens), the end-of-text token is forced, which closes
+# the window with a short output that usually passes transcribe()'s checks.  The tokens
+# the decoder did not have to produce are counted and, at the decode's own measured
+# speed per token, reported as time saved.
+#
+# Afterwards the segments holding a repeated run are marked "degenerate": True so they
+# can be reviewed or left out downstream.  The guard patches whisper's DecodingTask for
+# the duration of a with block, so it covers one transcription at a time per process.
+
+NGRAM_MAX = 10
+MIN_REPEATS = 4
+MIN_REPEATED_TOKENS = 12
+
+
+def new_stats():
+    return {"fired": 0, "tokens_skipped": 0, "seconds_saved": 0.0, "degenerate_segments": 0, "degenerate_seconds": 0.0}
+
+def repeated_run_start(tokens):
+    # Index where a run of one n-gram repeated up to the end of tokens begins, or None
+    # if no run is long enough to count
+    best = None
+    for n in range(1, min(NGRAM_MAX, len(tokens) // MIN_REPEATS) + 1):
+        gram = tokens[-n:]
+        start = len(tokens) - n
+        while start >= n and tokens[start - n:start] == gram:
+            start -= n
+        repeats = (len(tokens) - start) // n
+        if repeats >= MIN_REPEATS and repeats * n >= MIN_REPEATED_TOKENS:
+            best = start if best is None else min(best, start)
+    return best
+
+class RepetitionGuardFilter(LogitFilter):
+    def __init__(self, eot, sample_begin, sample_len, stats):
+        self.eot = eot
+        self.sample_begin = sample_begin
+        self.sample_len = sample_len
+        self.stats = stats
+        self.steps = 0
+        self.first_step = None
+        self.fired = False
+
+    def apply(self, logits, tokens):
+        now = time.perf_counter()
+        if self.first_step is None:
+            self.first_step = now
+        self.steps += 1
+        for row in range(tokens.shape[0]):
+            generated = tokens[row, self.sample_begin:].tolist()
+            if generated and generated[-1] == self.eot:
+                continue
+            text_tokens = [token for token in generated if token < self.eot]
+            if repeated_run_start(text_tokens) is None:
+                continue
+            logits[row] = -float("inf")
+            logits[row, self.eot] = 0
+            if not self.fired:
+                # Count each decode once, at the speed it has been running so far
+                self.fired = True
+                skipped = max(0, self.sample_len - len(generated))
+                seconds_per_step = (now - self.first_step) / max(1, self.steps - 1)
+                self.stats["fired"] += 1
+                self.stats["tokens_skipped"] += skipped
+                self.stats["seconds_saved"] += skipped * seconds_per_step
+
+@contextlib.contextmanager
+def guarded(stats):
+    original_init = DecodingTask.__init__
+
+    def init_with_guard(task, model, options):
+        original_init(task, model, options)
+        task.logit_filters.append(RepetitionGuardFilter(task.tokenizer.eot, task.sample_begin, task.sample_len, stats))
+
+    DecodingTask.__init__ = init_with_guard
+    try:
+        yield stats
+    finally:
+        DecodingTask.__init__ = original_init
+
+def mark_degenerate(model, segments, stats):
+    # Repetition is looked for per decoding window, across the segments it produced,
+    # since a loop often spans several short segments
+    eot = get_tokenizer(model.is_multilingual, num_languages=model.num_languages).eot
+    windows = {}
+    for segment in segments:
+        windows.setdefault(segment.get("seek", 0), []).append(segment)
+    for window in windows.values():
+        tokens = []
+        owners = []
+        for segment in window:
+            for token in segment.get("tokens", []):
+                if token < eot:
+                    tokens.append(token)
+                    owners.append(segment)
+        start = repeated_run_start(tokens)
+        if start is None:
+            continue
+        repeating = {id(segment) for segment in owners[start:]}
+        for segment in window:
+            if id(segment) in repeating and not segment.get("degenerate"):
+                segment["degenerate"] = True
+                stats["degenerate_segments"] += 1
+                stats["degenerate_seconds"] += segment["end"] - segment["start"]
+    return stats
+
+def report(stats):
+    return (f"Repetition guard: stopped {stats['fired']} runaway decode(s), skipping {stats['tokens_skipped']} token(s) "
+            f"(about {stats['seconds_saved']:.1f}s of decoding); {stats['degenerate_segments']} degenerate segment(s) "
+            f"covering {stats['degenerate_seconds']:.1f}s")
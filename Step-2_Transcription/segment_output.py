@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import argparse
+
+# Segment output for transcription runs.  Segments are appended to a JSON lines file as
+# soon as they are decoded, one object per line, so a crash loses at most the slice in
+# progress and other tools can read the first half of a panel while the second half is
+# still being transcribed.  SRT and WebVTT files can be rendered from the JSON lines at
+# any point, including from a run that is still going:
+#
+#   python segment_output.py "Panel 1.jsonl" --srt "Panel 1.srt" --vtt "Panel 1.vtt"
+
+SEGMENT_FIELDS = ("id", "start", "end", "text", "avg_logprob", "compression_ratio", "no_speech_prob", "temperature",
+                  "model", "degenerate")
+
+
+def format_timestamp(seconds, decimal_marker):
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+
+def read_segments_jsonl(path, repair=False):
+    # A run that died mid-write can leave a partial last line; it is ignored, and with
+    # repair=True cut off so the next append starts on a clean line
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    complete = data[:data.rfind(b"\n") + 1]
+    if repair and len(complete) != len(data):
+        with open(path, "r+b") as f:
+            f.truncate(len(complete))
+    return [json.loads(line) for line in complete.decode("utf-8").splitlines() if line.strip()]
+
+def append_segments_jsonl(f, segments):
+    for segment in segments:
+        record = {field: segment[field] for field in SEGMENT_FIELDS if field in segment}
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def render_srt(segments):
+    blocks = []
+    for index, segment in enumerate(segments, start=1):
+        blocks.append(f"{index}\n{format_timestamp(segment['start'], ',')} --> {format_timestamp(segment['end'], ',')}\n"
+                      f"{segment['text'].strip()}\n")
+    return "\n".join(blocks)
+
+def render_vtt(segments):
+    blocks = ["WEBVTT\n"]
+    for segment in segments:
+        blocks.append(f"{format_timestamp(segment['start'], '.')} --> {format_timestamp(segment['end'], '.')}\n"
+                      f"{segment['text'].strip()}\n")
+    return "\n".join(blocks)
+
+def write_subtitles(segments, srt_path=None, vtt_path=None):
+    if srt_path:
+        with open(srt_path, "w") as f:
+            f.write(render_srt(segments))
+    if vtt_path:
+        with open(vtt_path, "w") as f:
+            f.write(render_vtt(segments))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Render SRT/WebVTT subtitles from a segment JSON lines file.")
+    parser.add_argument("jsonl", help="Segment JSON lines written by transcribe.py --jsonl")
+    parser.add_argument("--srt", default=None, help="Write SRT subtitles here")
+    parser.add_argument("--vtt", default=None, help="Write WebVTT subtitles here")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    segments = read_segments_jsonl(args.jsonl)
+    write_subtitles(segments, args.srt, args.vtt)
+    print(f"Rendered {len(segments)} segment(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import transcribe_parallel
+from checks import check, finish
+
+# Stitching parallel chunks: chunks overlap their neighbours by a second, each segment
+# must be kept by exactly one chunk (the one whose span holds its midpoint), and a
+# repeat that straddles a boundary must be dropped.  No model is loaded.
+#   python stitch_test.py
+
+
+def segment(start, end, text):
+    return {"id": 0, "start": start, "end": end, "text": text}
+
+def main():
+    # Chunk 1 was transcribed from 59 s, a second before its span starts
+    chunks = [
+        {"index": 0, "start": 0.0, "end": 60.0, "offset": 0.0, "overlaps_next": True},
+        {"index": 1, "start": 60.0, "end": 120.0, "offset": 59.0, "overlaps_next": True},
+    ]
+    first = transcribe_parallel.owned_segments([
+        segment(0.0, 5.0, " Welcome."),
+        segment(56.0, 61.5, " Over to you."),      # midpoint 58.75: chunk 0's
+        segment(59.5, 60.5, " Thanks."),           # midpoint 60.0: chunk 1's
+    ], chunks[0])
+    second = transcribe_parallel.owned_segments([
+        segment(0.0, 2.5, " Over to you."),        # 59.0-61.5, the same words seen again
+        segment(0.5, 1.5, " Thanks."),             # 59.5-60.5
+        segment(10.0, 14.0, " First question."),   # 69.0-73.0
+        segment(61.0, 62.0, " Next panel."),       # 120.0-121.0, the next chunk's overlap
+    ], chunks[1])
+
+    ok = check("chunk 0 keeps the segments whose midpoint is in its span",
+               [s["text"] for s in first] == [" Welcome.", " Over to you."])
+    ok &= check("chunk 1 segments are moved onto the recording's timeline",
+                [(s["start"], s["end"]) for s in second] == [(59.0, 61.5), (59.5, 60.5), (69.0, 73.0)])
+    ok &= check("a segment in the overlap after the span is left to the next chunk",
+                " Next panel." not in [s["text"] for s in second])
+
+    # The last chunk has nothing after it, and manifest chunks are cut back to back, so
+    # a final timestamp that runs past the end of the audio must not lose the segment
+    last = transcribe_parallel.owned_segments([
+        segment(60.0, 63.0, " Thank you all."),    # 179.0-182.0, audio ends at 180
+    ], {"index": 2, "start": 120.0, "end": 180.0, "offset": 119.0, "overlaps_next": False})
+    ok &= check("the last chunk keeps a segment that runs past its end",
+                [s["text"] for s in last] == [" Thank you all."])
+    manifest = transcribe_parallel.owned_segments([
+        segment(298.0, 304.0, " and that's the panel."),
+    ], {"index": 0, "start": 0.0, "end": 300.0, "offset": 0.0, "path": "Panel 1_chunk_000.wav"})
+    ok &= check("a chunk without overlap keeps a segment whose midpoint is past its end",
+                len(manifest) == 1)
+
+    # Results arrive in completion order, not chunk order
+    result = transcribe_parallel.stitch_segments([
+        {"index": 1, "segments": second, "language": "en"},
+        {"index": 0, "segments": first, "language": "en"},
+    ])
+    texts = [s["text"] for s in result["segments"]]
+    ok &= check(f"the straddling repeat is kept once and the order is restored ({texts})",
+                texts == [" Welcome.", " Over to you.", " Thanks.", " First question."])
+    ok &= check("segment ids are renumbered in order",
+                [s["id"] for s in result["segments"]] == list(range(len(texts))))
+    ok &= check("timestamps never go backwards",
+                all(a["start"] <= b["start"] for a, b in zip(result["segments"], result["segments"][1:])))
+    ok &= check("text and language come from the stitched segments",
+                result["text"] == "".join(texts) and result["language"] == "en")
+
+    return finish(ok)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
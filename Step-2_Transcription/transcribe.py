@@ -1,9 +1,255 @@
+import sys
+import json
+import argparse
+
+import numpy as np
 import whisper
 
-model = whisper.load_model("large")
-result = model.transcribe("/Users/johndoe/Downloads/KD_audio_message.m4a")
+import vad
+import feature_cache
+import repetition_guard
+import segment_output
+import transcript_cache
+
+# Defaults used when the script is run without arguments.
+# Be sure to set the audio path and the output path before running.
+MODEL_NAME = "large"
+AUDIO_PATH = "/Users/johndoe/Downloads/KD_audio_message.m4a"
+OUTPUT_PATH = "file-output-path.txt"
+
+# Passing "-" as the audio path reads raw float32 16 kHz mono PCM from stdin, which is
+# what the Step 1 splitter writes with --stream.  The audio goes straight from one
+# ffmpeg process into memory without an intermediate file or a second decode:
+#   python "audio-video-filesplit-plus-diagnostics(007).py" panel.mp4 --stream --track 1 | python transcribe.py - -o panel.txt
+STDIN_PATH = "-"
+
+# With --jsonl the recording is transcribed in slices of about SLICE_SECONDS, cut at
+# pauses, and each slice's segments are appended to the JSON lines file as soon as it
+# finishes.  --resume picks up after the last complete segment of an earlier run.
+SLICE_SECONDS = 120.0
+PROMPT_CHARACTERS = 200
+
+# Options passed to model.transcribe in every mode, on top of whisper's own defaults
+TRANSCRIBE_OPTIONS = {}
+
+# --int8 runs the model with its linear layers dynamically quantized to int8, which is
+# faster and smaller on CPU at some cost in accuracy.  Check the trade-off first with
+#   python benchmark_models.py --audio-dir recordings --models large --precision fp32 int8
+
+# --repetition-guard stops a decode as soon as it starts repeating itself, marks the
+# segments it produced as degenerate and reports the decoding time saved (see
+# repetition_guard.py).
+
+# --feature-cache keeps the decoded audio as a memory-mapped file (see feature_cache.py),
+# so running the same recording again skips the ffmpeg decode.
+
+
+def quantize_int8(model):
+    # torch only swaps modules whose type is exactly nn.Linear, and whisper uses its own
+    # subclass that merely casts the weights to the input dtype.  In fp32 on CPU that
+    # cast does nothing, so the layers can become plain nn.Linear before quantizing.
+    # Quantizing in place frees each fp32 weight as its layer is replaced, instead of
+    # holding a second full copy of the model.
+    import torch
+    model = model.cpu().float()
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def load_model(model_name, int8=False):
+    if int8:
+        return quantize_int8(whisper.load_model(model_name, device="cpu"))
+    return whisper.load_model(model_name)
+
+def read_pcm_stream(stream, chunk_size=1 << 20):
+    # Collect the raw bytes, then view them as float32 samples without another copy
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+    usable = len(buffer) - len(buffer) % 4
+    return np.frombuffer(memoryview(buffer)[:usable], dtype=np.float32)
+
+def load_audio(audio_path, feature_cache_directory=None):
+    if audio_path == STDIN_PATH:
+        return read_pcm_stream(sys.stdin.buffer)
+    if feature_cache_directory:
+        return feature_cache.cached_audio(audio_path, feature_cache_directory)
+    return whisper.load_audio(audio_path)
+
+def load_input_audio(audio_path, feature_cache_directory=None):
+    # The audio for a command line run, or None (after saying so) if there is none,
+    # e.g. an empty stream on stdin
+    audio = load_audio(audio_path, feature_cache_directory)
+    if audio.size == 0:
+        print("No audio received.", file=sys.stderr)
+        return None
+    return audio
+
+def transcribe_audio(model, audio, guard_stats=None, **options):
+    # guard_stats, from repetition_guard.new_stats(), turns the guard on and collects
+    # its counts across calls
+    if guard_stats is None:
+        return model.transcribe(audio, **options)
+    with repetition_guard.guarded(guard_stats):
+        result = model.transcribe(audio, **options)
+    repetition_guard.mark_degenerate(model, result["segments"], guard_stats)
+    return result
+
+def transcribe_speech_only(model, audio, **options):
+    # Drop non-speech (room noise, breaks, setup chatter) before transcribing, then map
+    # the segment timestamps back onto the original recording
+    trimmed, offset_map = vad.trim_to_speech(audio)
+    kept = len(trimmed) / len(audio) if len(audio) else 0
+    print(f"VAD kept {len(trimmed) / vad.SAMPLE_RATE:.0f}s of {len(audio) / vad.SAMPLE_RATE:.0f}s "
+          f"({100 * (1 - kept):.0f}% removed)", file=sys.stderr)
+    if not offset_map:
+        return {"text": "", "segments": [], "language": None}
+
+    result = transcribe_audio(model, trimmed, **options)
+    vad.remap_segments(result["segments"], offset_map)
+    return result
+
+def transcribe_incremental(model, audio, jsonl_path, resume=False, slice_seconds=SLICE_SECONDS,
+                           srt_path=None, vtt_path=None, **options):
+    segments = segment_output.read_segments_jsonl(jsonl_path, repair=True) if resume else []
+    resume_at = segments[-1]["end"] if segments else 0.0
+    if segments:
+        print(f"Resuming after {len(segments)} segment(s) at {resume_at:.1f}s", file=sys.stderr)
+
+    duration = len(audio) / vad.SAMPLE_RATE
+    cuts = [cut for cut in vad.silence_cut_points(audio, slice_seconds, min_chunk=slice_seconds / 4) if cut > resume_at]
+    bounds = [resume_at] + cuts + [duration]
+    language = options.pop("language", None)
+
+    with open(jsonl_path, "a" if resume else "w") as f:
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end - start < 0.1:
+                continue
+            # The tail of what has been said so far carries context across slices, the
+            # way condition_on_previous_text does across windows
+            prompt = "".join(segment["text"] for segment in segments)[-PROMPT_CHARACTERS:] or None
+            result = transcribe_audio(model, audio[int(start * vad.SAMPLE_RATE):int(end * vad.SAMPLE_RATE)],
+                                      initial_prompt=prompt, language=language, **options)
+            language = language or result.get("language")
+
+            new_segments = result["segments"]
+            for index, segment in enumerate(new_segments, start=len(segments)):
+                segment["id"] = index
+                segment["start"] = round(segment["start"] + start, 3)
+                segment["end"] = round(segment["end"] + start, 3)
+            segment_output.append_segments_jsonl(f, new_segments)
+            segments += new_segments
+            segment_output.write_subtitles(segments, srt_path, vtt_path)
+            print(f"Transcribed {end:.0f}s of {duration:.0f}s ({len(segments)} segments)", file=sys.stderr)
+
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": language}
+
+def transcribe_with_cache(audio, model_name, cache_directory, options, run):
+    # The audio is looked up before anything expensive happens; run() loads the model
+    # and transcribes only on a miss
+    key = transcript_cache.cache_key(audio, model_name, options)
+    result = transcript_cache.cache_get(cache_directory, key)
+    if result is not None:
+        return result, True
+    result = run()
+    transcript_cache.cache_put(cache_directory, key, result)
+    return result, False
+
+def settings_for(mode, int8=False, repetition_guard=False):
+    # Everything that decides the result: how the model is loaded, how the audio is cut
+    # up before decoding ("whole", "vad" or "jsonl"), and every option that reaches
+    # model.transcribe.  This is the transcript cache key wherever a transcript is
+    # cached (here and in transcribe_worker.py), and the runs take their settings from
+    # it as well, so a setting cannot change the result without changing the key.
+    settings = {
+        "whisper": getattr(whisper, "__version__", None),
+        "mode": mode,
+        "int8": int8,
+        "repetition_guard": repetition_guard,
+        "transcribe_options": dict(TRANSCRIBE_OPTIONS),
+    }
+    if mode == "jsonl":
+        settings["slice_seconds"] = SLICE_SECONDS
+        settings["prompt_characters"] = PROMPT_CHARACTERS
+    return settings
+
+def transcription_settings(args):
+    return settings_for("jsonl" if args.jsonl else "vad" if args.vad else "whole", args.int8, args.repetition_guard)
+
+def write_text(result, output_path):
+    with open(output_path, "w") as f:
+        f.write(result["text"])
+
+def write_json(result, output_path):
+    with open(output_path, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Transcribe an audio file with Whisper.")
+    parser.add_argument("audio", nargs="?", default=AUDIO_PATH,
+                        help="Audio file, or '-' for raw float32 16 kHz mono PCM on stdin")
+    parser.add_argument("-o", "--output", default=OUTPUT_PATH, help="Where to write the transcript text")
+    parser.add_argument("-m", "--model", default=MODEL_NAME, help="Whisper model name")
+    parser.add_argument("--vad", action="store_true", help="Skip non-speech before transcribing")
+    parser.add_argument("--int8", action="store_true", help="Use int8 dynamic quantization (CPU only)")
+    parser.add_argument("--repetition-guard", action="store_true",
+                        help="Stop decodes that fall into a repetition loop and mark their segments degenerate")
+    parser.add_argument("--jsonl", default=None, help="Append segments to this JSON lines file as they are decoded")
+    parser.add_argument("--resume", action="store_true", help="Continue after the last segment already in --jsonl")
+    parser.add_argument("--cache-dir", default=transcript_cache.CACHE_DIRECTORY, help="Transcript cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Always transcribe, ignoring the transcript cache")
+    feature_cache.add_cache_argument(parser)
+    parser.add_argument("--srt", default=None, help="Also write SRT subtitles")
+    parser.add_argument("--vtt", default=None, help="Also write WebVTT subtitles")
+    args = parser.parse_args(argv)
+    if args.resume and not args.jsonl:
+        parser.error("--resume needs --jsonl")
+    if args.vad and args.jsonl:
+        parser.error("--vad cannot be combined with --jsonl")
+    return args
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    audio = load_input_audio(args.audio, args.feature_cache)
+    if audio is None:
+        return 1
+
+    settings = transcription_settings(args)
+
+    def run():
+        model = load_model(args.model, settings["int8"])
+        options = dict(settings["transcribe_options"])
+        if settings["repetition_guard"]:
+            options["guard_stats"] = repetition_guard.new_stats()
+        if settings["mode"] == "jsonl":
+            result = transcribe_incremental(model, audio, args.jsonl, args.resume, settings["slice_seconds"],
+                                            srt_path=args.srt, vtt_path=args.vtt, **options)
+        elif settings["mode"] == "vad":
+            result = transcribe_speech_only(model, audio, **options)
+        else:
+            result = transcribe_audio(model, audio, **options)
+        if settings["repetition_guard"]:
+            result["repetition_guard"] = options["guard_stats"]
+            print(repetition_guard.report(options["guard_stats"]), file=sys.stderr)
+        return result
 
-with open("file-output-path.txt", "w") as f:
-    f.write(result["text"])
+    if args.no_cache:
+        result, cached = run(), False
+    else:
+        result, cached = transcribe_with_cache(audio, args.model, args.cache_dir, settings, run)
+        print(("Cache hit: " if cached else "") + transcript_cache.report(args.cache_dir), file=sys.stderr)
 
+    write_text(result, args.output)
+    if cached and args.jsonl:
+        with open(args.jsonl, "w") as f:
+            segment_output.append_segments_jsonl(f, result["segments"])
+    if cached or not args.jsonl:
+        segment_output.write_subtitles(result["segments"], args.srt, args.vtt)
+    return 0
 
+if __name__ == "__main__":
+    sys.exit(main())
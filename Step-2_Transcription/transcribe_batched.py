@@ -0,0 +1,200 @@
+import sys
+import time
+import argparse
+
+import torch
+import whisper
+from whisper.audio import HOP_LENGTH, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+
+import transcribe
+import vad
+import feature_cache
+
+# Batched transcription inside a single Whisper process.  model.transcribe() decodes its
+# 30 second windows one after another; here the recording is cut into windows of up to
+# 30 seconds at pauses up front, and N windows at a time go through the encoder and
+# decoder as one batch, which keeps the CPU's matrix units much busier.
+#
+# Because the windows are independent, the previous window's text is not used as a
+# prompt.  A window whose batched decode looks unreliable (the same compression-ratio
+# and log-probability checks transcribe() uses) is redone on its own with
+# model.transcribe() and its full temperature fallback.
+#
+# --compare runs the current sequential path on the same audio as well and prints the
+# throughput of both and the word error rate between their transcripts.
+#
+# With --feature-cache the decoded audio and every window's log-mel spectrogram are kept
+# as memory-mapped files, so a rerun at another batch size or beam size, or the batched
+# half of --compare, starts straight from the features.
+#
+#   python transcribe_batched.py "Panel 1_output_audio_track_1.wav" -o "Panel 1.txt" --batch-size 8 --compare
+
+# Seconds per timestamp token
+TIME_PRECISION = 2 * HOP_LENGTH / SAMPLE_RATE
+WINDOW_SECONDS = N_SAMPLES / SAMPLE_RATE
+BATCH_SIZE = 8
+
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def plan_windows(audio):
+    # Leave a little headroom under 30 s so a window is never trimmed by pad_or_trim
+    duration = len(audio) / SAMPLE_RATE
+    bounds = [0.0] + vad.silence_cut_points(audio, max_chunk=WINDOW_SECONDS - 1, min_chunk=5.0) + [duration]
+    return [(start, audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+def windows_to_mel(model, windows, audio=None, feature_cache_directory=None):
+    if feature_cache_directory is None:
+        mels = [log_mel_spectrogram(pad_or_trim(window), model.dims.n_mels) for _, window in windows]
+    else:
+        key = feature_cache.audio_key(audio)
+        mels = []
+        for start, window in windows:
+            start_sample = int(start * SAMPLE_RATE)
+            mels.append(torch.from_numpy(feature_cache.cached_mel(audio, start_sample, start_sample + len(window),
+                                                                  model.dims.n_mels, feature_cache_directory, key)))
+    return torch.stack(mels).to(model.device)
+
+def tokens_to_segments(tokens, tokenizer, offset, window_seconds, decoding_result):
+    # Whisper brackets each segment with timestamp tokens: <|0.00|> text <|2.40|>
+    segments = []
+    text_tokens = []
+    segment_start = None
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            timestamp = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if segment_start is not None and text_tokens:
+                segments.append((segment_start, timestamp, text_tokens))
+                text_tokens = []
+                segment_start = None
+            else:
+                segment_start = timestamp
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens:
+        segments.append((segment_start or 0.0, window_seconds, text_tokens))
+
+    return [
+        {
+            "seek": int(offset * SAMPLE_RATE / HOP_LENGTH),
+            "start": round(offset + start, 3),
+            "end": round(offset + min(end, window_seconds), 3),
+            "text": tokenizer.decode(text_tokens),
+            "tokens": text_tokens,
+            "temperature": decoding_result.temperature,
+            "avg_logprob": decoding_result.avg_logprob,
+            "compression_ratio": decoding_result.compression_ratio,
+            "no_speech_prob": decoding_result.no_speech_prob,
+        }
+        for start, end, text_tokens in segments
+    ]
+
+def needs_fallback(decoding_result):
+    return (decoding_result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+            or decoding_result.avg_logprob < LOGPROB_THRESHOLD)
+
+def is_silent(decoding_result):
+    return (decoding_result.no_speech_prob > NO_SPEECH_THRESHOLD
+            and decoding_result.avg_logprob < LOGPROB_THRESHOLD)
+
+def transcribe_batched(model, audio, batch_size=BATCH_SIZE, language=None, beam_size=None,
+                       feature_cache_directory=None):
+    fp16 = model.device.type != "cpu"
+    windows = plan_windows(audio)
+
+    # Detect the language once so every window is decoded with the same tokenizer
+    if language is None and not model.is_multilingual:
+        language = "en"
+    elif language is None:
+        _, probs = model.detect_language(windows_to_mel(model, windows[:1], audio, feature_cache_directory))
+        language = max(probs[0], key=probs[0].get)
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                              language=language, task="transcribe")
+    options = DecodingOptions(language=language, temperature=0.0, beam_size=beam_size, fp16=fp16)
+
+    segments = []
+    fallback_windows = []
+    for batch_start in range(0, len(windows), batch_size):
+        batch = windows[batch_start:batch_start + batch_size]
+        results = whisper.decode(model, windows_to_mel(model, batch, audio, feature_cache_directory), options)
+        for (offset, window), result in zip(batch, results):
+            if is_silent(result):
+                continue
+            if needs_fallback(result):
+                fallback_windows.append((offset, window))
+                continue
+            segments += tokens_to_segments(result.tokens, tokenizer, offset, len(window) / SAMPLE_RATE, result)
+
+    for offset, window in fallback_windows:
+        result = model.transcribe(window, language=language, fp16=fp16, condition_on_previous_text=False)
+        for segment in result["segments"]:
+            segment["start"] = round(segment["start"] + offset, 3)
+            segment["end"] = round(segment["end"] + offset, 3)
+            segments.append(segment)
+
+    segments.sort(key=lambda segment: segment["start"])
+    for index, segment in enumerate(segments):
+        segment["id"] = index
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": language,
+        "windows": len(windows),
+        "fallback_windows": len(fallback_windows),
+    }
+
+def compare_throughput(model, audio, batch_size, beam_size=None, feature_cache_directory=None):
+    from benchmark_models import word_error_rate
+
+    audio_seconds = len(audio) / SAMPLE_RATE
+    start = time.time()
+    sequential = transcribe.transcribe_audio(model, audio, fp16=model.device.type != "cpu", beam_size=beam_size)
+    sequential_seconds = time.time() - start
+
+    start = time.time()
+    batched = transcribe_batched(model, audio, batch_size, sequential.get("language"), beam_size, feature_cache_directory)
+    batched_seconds = time.time() - start
+
+    print(f"Audio:      {audio_seconds:.0f}s")
+    print(f"Sequential: {sequential_seconds:.1f}s ({audio_seconds / sequential_seconds:.1f}x realtime)")
+    print(f"Batched:    {batched_seconds:.1f}s ({audio_seconds / batched_seconds:.1f}x realtime, "
+          f"batch size {batch_size}, {batched['windows']} windows, {batched['fallback_windows']} redone)")
+    print(f"Speedup:    {sequential_seconds / batched_seconds:.2f}x")
+    print(f"WER of batched against sequential: {word_error_rate(sequential['text'], batched['text']):.4f}")
+    return batched
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Transcribe with batched decoding of 30 second windows.")
+    parser.add_argument("audio", help="Audio file, or '-' for raw float32 16 kHz mono PCM on stdin")
+    parser.add_argument("-o", "--output", default=transcribe.OUTPUT_PATH, help="Where to write the transcript text")
+    parser.add_argument("--json", default=None, help="Also write the segments as JSON")
+    parser.add_argument("-m", "--model", default=transcribe.MODEL_NAME, help="Whisper model name")
+    parser.add_argument("-b", "--batch-size", type=int, default=BATCH_SIZE, help="Windows decoded per batch")
+    parser.add_argument("--beam-size", type=int, default=None, help="Beam size (default: greedy)")
+    parser.add_argument("--language", default=None, help="Language code (default: detect from the first window)")
+    feature_cache.add_cache_argument(parser, help_text="Reuse decoded audio and mel windows from this directory")
+    parser.add_argument("--compare", action="store_true", help="Also time the sequential path and compare")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    audio = transcribe.load_input_audio(args.audio, args.feature_cache)
+    if audio is None:
+        return 1
+
+    model = whisper.load_model(args.model)
+    if args.compare:
+        result = compare_throughput(model, audio, args.batch_size, args.beam_size, args.feature_cache)
+    else:
+        result = transcribe_batched(model, audio, args.batch_size, args.language, args.beam_size, args.feature_cache)
+    transcribe.write_text(result, args.output)
+    if args.json:
+        transcribe.write_json(result, args.json)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import sys
+import time
+import argparse
+
+import whisper
+
+import transcribe
+import segment_output
+import feature_cache
+
+# Two-model cascade.  The whole recording is transcribed with a fast model first; the
+# segments it was unsure about are then re-decoded with the large model and spliced
+# back in.  Clean audio never touches the large model, so most of its accuracy comes at
+# a fraction of its CPU time.
+#
+# A segment counts as weak when its average log-probability is low, its text is
+# suspiciously repetitive (high compression ratio), or the model thought the audio was
+# probably not speech yet produced text anyway.  Neighbouring weak segments are merged
+# into one span, padded a little, and each span is re-decoded as a unit.  Every segment
+# in the output records the model that produced it.
+#
+#   python transcribe_cascade.py "Panel 1_output_audio_track_1.wav" -o "Panel 1.txt" --json "Panel 1.json"
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+FAST_MODEL = "small"
+ACCURATE_MODEL = transcribe.MODEL_NAME
+
+LOGPROB_THRESHOLD = -0.8
+COMPRESSION_RATIO_THRESHOLD = 2.4
+NO_SPEECH_THRESHOLD = 0.5
+SPAN_PADDING = 0.5
+SPAN_MERGE_GAP = 2.0
+
+
+def is_weak(segment, logprob_threshold=LOGPROB_THRESHOLD):
+    return (segment["avg_logprob"] < logprob_threshold
+            or segment["compression_ratio"] > COMPRESSION_RATIO_THRESHOLD
+            or segment["no_speech_prob"] > NO_SPEECH_THRESHOLD)
+
+def weak_spans(segments, duration, logprob_threshold=LOGPROB_THRESHOLD):
+    spans = []
+    for segment in segments:
+        if not is_weak(segment, logprob_threshold):
+            continue
+        start = max(0.0, segment["start"] - SPAN_PADDING)
+        end = min(duration, segment["end"] + SPAN_PADDING)
+        if spans and start - spans[-1][1] <= SPAN_MERGE_GAP:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return [tuple(span) for span in spans]
+
+def redecode_span(model, audio, span, prompt):
+    start, end = span
+    result = transcribe.transcribe_audio(model, audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)],
+                                         initial_prompt=prompt or None, condition_on_previous_text=False)
+    segments = []
+    for segment in result["segments"]:
+        segment["start"] = round(segment["start"] + start, 3)
+        segment["end"] = round(segment["end"] + start, 3)
+        segments.append(segment)
+    return segments
+
+def transcribe_cascade(audio, fast_model_name=FAST_MODEL, accurate_model_name=ACCURATE_MODEL,
+                       logprob_threshold=LOGPROB_THRESHOLD, int8=False):
+    duration = len(audio) / SAMPLE_RATE
+    timings = {}
+
+    start = time.time()
+    fast_model = transcribe.load_model(fast_model_name, int8)
+    first_pass = transcribe.transcribe_audio(fast_model, audio)
+    timings["fast_seconds"] = time.time() - start
+    for segment in first_pass["segments"]:
+        segment["model"] = fast_model_name
+
+    spans = weak_spans(first_pass["segments"], duration, logprob_threshold)
+    segments = first_pass["segments"]
+    redecoded = 0.0
+    if spans:
+        start = time.time()
+        accurate_model = transcribe.load_model(accurate_model_name, int8)
+        for span in spans:
+            # Keep the fast segments outside the span, widening it to cover whole
+            # segments at its edges; the prompt is the text that precedes it
+            before = [segment for segment in segments if segment["end"] <= span[0]]
+            after = [segment for segment in segments if segment["start"] >= span[1]]
+            replaced = segments[len(before):len(segments) - len(after)]
+            if replaced:
+                span = (min(span[0], replaced[0]["start"]), max(span[1], replaced[-1]["end"]))
+            prompt = "".join(segment["text"] for segment in before)[-transcribe.PROMPT_CHARACTERS:]
+            replacement = redecode_span(accurate_model, audio, span, prompt)
+            redecoded += span[1] - span[0]
+            for segment in replacement:
+                segment["model"] = accurate_model_name
+            segments = before + replacement + after
+        timings["accurate_seconds"] = time.time() - start
+
+    for index, segment in enumerate(segments):
+        segment["id"] = index
+    summary = {
+        "audio_seconds": round(duration, 1),
+        "weak_spans": len(spans),
+        "redecoded_seconds": round(redecoded, 1),
+        "redecoded_fraction": round(redecoded / duration, 3) if duration else 0,
+        **{name: round(value, 1) for name, value in timings.items()},
+    }
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": first_pass.get("language"),
+        "cascade": summary,
+    }
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Transcribe with a fast model and re-decode weak segments with a large one.")
+    parser.add_argument("audio", help="Audio file, or '-' for raw float32 16 kHz mono PCM on stdin")
+    parser.add_argument("-o", "--output", default=transcribe.OUTPUT_PATH, help="Where to write the transcript text")
+    parser.add_argument("--json", default=None, help="Also write the segments, with the model for each, as JSON")
+    parser.add_argument("--srt", default=None, help="Also write SRT subtitles")
+    parser.add_argument("--vtt", default=None, help="Also write WebVTT subtitles")
+    parser.add_argument("--fast-model", default=FAST_MODEL, help="Model for the first pass")
+    parser.add_argument("--accurate-model", default=ACCURATE_MODEL, help="Model for re-decoding weak segments")
+    parser.add_argument("--logprob-threshold", type=float, default=LOGPROB_THRESHOLD,
+                        help="Segments with a lower average log-probability are re-decoded")
+    parser.add_argument("--int8", action="store_true", help="Use int8 dynamic quantization for both models (CPU only)")
+    feature_cache.add_cache_argument(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    audio = transcribe.load_input_audio(args.audio, args.feature_cache)
+    if audio is None:
+        return 1
+
+    result = transcribe_cascade(audio, args.fast_model, args.accurate_model, args.logprob_threshold, args.int8)
+    summary = result["cascade"]
+    print(f"{summary['weak_spans']} weak span(s), {summary['redecoded_seconds']}s of {summary['audio_seconds']}s "
+          f"({100 * summary['redecoded_fraction']:.0f}%) re-decoded with {args.accurate_model}", file=sys.stderr)
+
+    transcribe.write_text(result, args.output)
+    if args.json:
+        transcribe.write_json(result, args.json)
+    segment_output.write_subtitles(result["segments"], args.srt, args.vtt)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
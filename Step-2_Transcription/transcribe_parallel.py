@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import whisper
+
+import transcribe
+import vad
+import feature_cache
+
+# Parallel transcription of one long recording.  The audio is split into chunks at
+# pauses, the chunks are spread over a pool of worker processes (each with its own
+# model and a share of the CPU threads), and the segments are stitched back together
+# in order with timestamps in the original recording.
+#
+# Where no pause is available a chunk is cut hard, so every chunk is transcribed with a
+# little overlap on each side.  A segment is kept only by the chunk whose own span
+# contains its midpoint, which removes the duplicates the overlap produces.
+#
+# With --feature-cache the decoded recording is written once as a flat float32 file and
+# each chunk is sent to its worker as a file name and sample range instead of a pickled
+# copy of its samples; workers map the file, so the recording sits in memory once no
+# matter how many workers read it, and a rerun skips the decode altogether.
+#
+# Each worker normally loads its own copy of the model, which multiplies its memory by
+# the number of workers.  With --share-model the parent loads it once and moves its
+# weights into shared memory; the workers receive handles to those pages rather than
+# copies.  (Forking after the load would share the pages as well, but the workers are
+# spawned to keep torch's thread pools out of a fork, see transcribe_in_parallel.)
+# Every worker reports its memory when it finishes a chunk: Rss counts the shared
+# weights in full in every process, Pss divides them among the processes using them,
+# so the sum of Pss is what the pool really costs.
+#
+# Instead of splitting in memory, a manifest from Step 1's audio-silence-chunker.py can
+# be given with --manifest; its chunks are transcribed as they are.
+#
+#   python transcribe_parallel.py "Panel 1_output_audio_track_1.wav" -o "Panel 1.txt" --workers 4
+#   python transcribe_parallel.py --manifest chunks/Panel_1_chunks.json -o "Panel 1.txt"
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+MAX_CHUNK = 120.0
+MIN_CHUNK = 20.0
+OVERLAP = 1.0
+
+# Set in each worker process by init_worker
+worker_model = None
+worker_feature_cache = None
+
+
+def plan_chunks(audio, max_chunk=MAX_CHUNK, min_chunk=MIN_CHUNK, overlap=OVERLAP, pcm_path=None):
+    duration = len(audio) / SAMPLE_RATE
+    bounds = [0.0] + vad.silence_cut_points(audio, max_chunk, min_chunk) + [duration]
+    chunks = []
+    for index, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        padded_start = max(0.0, start - overlap)
+        padded_end = min(duration, end + overlap)
+        chunk = {
+            "index": index,
+            "start": start,
+            "end": end,
+            "offset": padded_start,
+            "overlaps_next": padded_end > end,
+        }
+        samples = (int(padded_start * SAMPLE_RATE), int(padded_end * SAMPLE_RATE))
+        if pcm_path:
+            chunk["pcm"], chunk["samples"] = pcm_path, samples
+        else:
+            chunk["audio"] = audio[samples[0]:samples[1]]
+        chunks.append(chunk)
+    return chunks
+
+def plan_chunks_from_manifest(manifest_path):
+    # Chunk files are listed relative to the manifest; their start is their offset
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest_directory = os.path.dirname(os.path.abspath(manifest_path))
+    return [
+        {
+            "index": chunk["index"],
+            "start": chunk["start"],
+            "end": chunk["end"],
+            "offset": chunk["start"],
+            "path": os.path.join(manifest_directory, chunk["file"]),
+        }
+        for chunk in manifest["chunks"]
+    ]
+
+def process_memory():
+    # Linux reports the split between shared and private pages; elsewhere only the peak
+    # RSS is available (kilobytes on Linux, bytes on macOS)
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss_mb": round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024))}
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024),
+        "pss_mb": round(fields.get("Pss", 0) / 1024),
+        "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024),
+    }
+
+def load_shared_model(model_name):
+    # Parameters are moved into shared memory here; the remaining buffers are small and
+    # are moved (or, for the sparse alignment heads, copied) when the model is pickled
+    # for each worker
+    model = whisper.load_model(model_name, device="cpu")
+    model.eval()
+    for parameter in model.parameters():
+        parameter.requires_grad_(False)
+        parameter.share_memory_()
+    return model
+
+def init_worker(model, threads, feature_cache_directory=None):
+    # Limit torch to this worker's share of the cores so workers don't oversubscribe.
+    # model is either a name to load or a model whose weights the parent shared.
+    global worker_model, worker_feature_cache
+    worker_feature_cache = feature_cache_directory
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    worker_model = whisper.load_model(model) if isinstance(model, str) else model
+
+def owned_segments(segments, chunk):
+    # Move the segments onto the recording's timeline and keep only the ones this
+    # chunk owns, so the overlap with its neighbours is not transcribed twice.  Only a
+    # chunk whose audio runs into the next one gives up segments past its end; the last
+    # chunk, manifest chunks and track chunks own everything from their start onward,
+    # since Whisper's final timestamp can land past the end of the audio.
+    owned = []
+    for segment in segments:
+        segment["start"] = round(segment["start"] + chunk["offset"], 3)
+        segment["end"] = round(segment["end"] + chunk["offset"], 3)
+        midpoint = (segment["start"] + segment["end"]) / 2
+        if chunk["start"] <= midpoint and (midpoint < chunk["end"] or not chunk.get("overlaps_next")):
+            owned.append(segment)
+    return owned
+
+def transcribe_chunk(chunk, options):
+    start_time = time.time()
+    if "audio" in chunk:
+        audio = chunk["audio"]
+    elif "pcm" in chunk:
+        audio = feature_cache.open_pcm(chunk["pcm"])[chunk["samples"][0]:chunk["samples"][1]]
+    else:
+        audio = transcribe.load_audio(chunk["path"], worker_feature_cache)
+    result = transcribe.transcribe_audio(worker_model, audio, **options)
+    return {
+        "index": chunk["index"],
+        "segments": owned_segments(result["segments"], chunk),
+        "language": result.get("language"),
+        "seconds": time.time() - start_time,
+        "pid": os.getpid(),
+        "memory": process_memory(),
+    }
+
+def stitch_segments(chunk_results):
+    segments = []
+    for chunk_result in sorted(chunk_results, key=lambda r: r["index"]):
+        for segment in chunk_result["segments"]:
+            # Drop a repeat of the previous segment that straddles a chunk boundary
+            if segments and segment["text"].strip() == segments[-1]["text"].strip() \
+                    and segment["start"] < segments[-1]["end"]:
+                continue
+            segments.append(segment)
+    for index, segment in enumerate(segments):
+        segment["id"] = index
+    languages = [r["language"] for r in chunk_results if r.get("language")]
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": max(set(languages), key=languages.count) if languages else None,
+    }
+
+def run_chunks(chunks, model_name, workers, threads_per_worker, options=None, feature_cache_directory=None,
+               share_model=False):
+    # torch.multiprocessing is plain multiprocessing plus pickling of shared tensors
+    import torch.multiprocessing
+    options = options or {}
+    # Workers are started fresh rather than forked so each gets a clean torch runtime
+    context = torch.multiprocessing.get_context("spawn")
+    model = load_shared_model(model_name) if share_model else model_name
+    chunk_results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(model, threads_per_worker, feature_cache_directory)) as executor:
+        # Longest chunks first so a long one does not start last and hold up the finish
+        futures = [executor.submit(transcribe_chunk, chunk, options)
+                   for chunk in sorted(chunks, key=lambda c: c["start"] - c["end"])]
+        for future in as_completed(futures):
+            chunk_result = future.result()
+            chunk_results.append(chunk_result)
+            print(f"Chunk {chunk_result['index'] + 1}/{len(chunks)} done in {chunk_result['seconds']:.1f}s",
+                  file=sys.stderr)
+    return chunk_results
+
+def transcribe_in_parallel(chunks, model_name, workers, threads_per_worker, options=None, feature_cache_directory=None,
+                           share_model=False):
+    chunk_results = run_chunks(chunks, model_name, workers, threads_per_worker, options, feature_cache_directory,
+                               share_model)
+    return stitch_segments(chunk_results), chunk_results
+
+def default_workers():
+    # Whisper stops scaling well below a handful of threads per process, so spread the
+    # cores over workers of about four threads each
+    return max(1, (os.cpu_count() or 1) // 4)
+
+def print_memory_report(chunk_results):
+    # The last report from each worker, plus the parent, which holds the shared model
+    workers = {}
+    for chunk_result in chunk_results:
+        workers[chunk_result["pid"]] = chunk_result["memory"]
+    rows = [("parent", os.getpid(), process_memory())] + [("worker", pid, memory) for pid, memory in sorted(workers.items())]
+    print(f"{'process':<8} {'pid':>8} {'rss MB':>8} {'pss MB':>8} {'private MB':>10}", file=sys.stderr)
+    for role, pid, memory in rows:
+        print(f"{role:<8} {pid:>8} {memory['rss_mb']:>8} {memory.get('pss_mb', '-'):>8} {memory.get('private_mb', '-'):>10}",
+              file=sys.stderr)
+    if all("pss_mb" in memory for _, _, memory in rows):
+        print(f"Total: {sum(memory['pss_mb'] for _, _, memory in rows)} MB proportional, "
+              f"{sum(memory['rss_mb'] for _, _, memory in rows)} MB summed RSS", file=sys.stderr)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Transcribe one recording with a pool of Whisper workers.")
+    parser.add_argument("audio", nargs="?", default=None, help="Audio file, or '-' for raw float32 PCM on stdin")
+    parser.add_argument("--manifest", default=None, help="Chunk manifest from audio-silence-chunker.py")
+    parser.add_argument("-o", "--output", default=transcribe.OUTPUT_PATH, help="Where to write the transcript text")
+    parser.add_argument("--json", default=None, help="Also write the stitched segments as JSON")
+    parser.add_argument("-m", "--model", default=transcribe.MODEL_NAME, help="Whisper model name")
+    parser.add_argument("-w", "--workers", type=int, default=default_workers(), help="Worker processes")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--max-chunk", type=float, default=MAX_CHUNK, help="Longest chunk in seconds")
+    parser.add_argument("--overlap", type=float, default=OVERLAP, help="Seconds of overlap on each side of a chunk")
+    feature_cache.add_cache_argument(parser, help_text="Share decoded audio with the workers through this directory")
+    parser.add_argument("--share-model", action="store_true",
+                        help="Load the model once in shared memory instead of once per worker (CPU only)")
+    args = parser.parse_args(argv)
+    if (args.audio is None) == (args.manifest is None):
+        parser.error("give either an audio file or --manifest")
+    return args
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.manifest:
+        chunks = plan_chunks_from_manifest(args.manifest)
+        audio_seconds = max(chunk["end"] for chunk in chunks) if chunks else 0
+    else:
+        audio = transcribe.load_input_audio(args.audio, args.feature_cache)
+        if audio is None:
+            return 1
+        pcm_path = feature_cache.share_audio(audio, args.feature_cache) if args.feature_cache else None
+        chunks = plan_chunks(audio, args.max_chunk, MIN_CHUNK, args.overlap, pcm_path)
+        audio_seconds = len(audio) / SAMPLE_RATE
+    if not chunks:
+        print("No audio to transcribe.", file=sys.stderr)
+        return 1
+
+    workers = max(1, min(args.workers, len(chunks)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"Transcribing {audio_seconds:.0f}s of audio as {len(chunks)} chunk(s) on {workers} worker(s) "
+          f"x {threads} thread(s)", file=sys.stderr)
+
+    start = time.time()
+    result, chunk_results = transcribe_in_parallel(chunks, args.model, workers, threads,
+                                                   feature_cache_directory=args.feature_cache,
+                                                   share_model=args.share_model)
+    elapsed = time.time() - start
+    busy = sum(r["seconds"] for r in chunk_results)
+    print(f"Done in {elapsed:.1f}s ({audio_seconds / elapsed:.1f}x realtime, "
+          f"{busy / elapsed:.1f} workers busy on average)", file=sys.stderr)
+    print_memory_report(chunk_results)
+
+    transcribe.write_text(result, args.output)
+    if args.json:
+        transcribe.write_json(result, args.json)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
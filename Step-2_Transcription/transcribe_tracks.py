@@ -0,0 +1,212 @@
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import transcribe
+import transcribe_parallel
+import vad
+import feature_cache
+import segment_output
+
+# Transcription of a multi-mic recording, one speaker lane per track.  Step 1 writes
+# every audio track of a recording as {base}_output_audio_track_N.mp3; with one
+# microphone per speaker each track is effectively one person, which gives speaker
+# separation without a diarization model.
+#
+# Each track is cut down to the spans where it carries speech of its own: the VAD
+# finds speech on the track, and frames where some other track is much louder are
+# dropped as that speaker bleeding into this microphone.  The spans of all tracks then
+# go through one pool of Whisper workers (see transcribe_parallel.py), and the segments
+# are merged by timestamp into a single transcript labelled by track.
+#
+#   python transcribe_tracks.py "Panel 1" -o "Panel 1.txt" --json "Panel 1.json" --names Moderator "Panelist A" "Panelist B"
+#   python transcribe_tracks.py "Panel 1_output_audio_track_1.mp3" "Panel 1_output_audio_track_2.mp3" -o "Panel 1.txt"
+
+SAMPLE_RATE = vad.SAMPLE_RATE
+FRAME_MS = 30
+# A frame belongs to a track only if it is within this much of the loudest track
+BLEED_MARGIN_DB = 10.0
+# Frame energy given to a track past its end; digital silence in vad.frame_features
+SILENCE_DB = -100.0
+# Spans closer than this are transcribed together, up to MAX_CHUNK seconds
+MERGE_GAP = 3.0
+MAX_CHUNK = transcribe_parallel.MAX_CHUNK
+# Track files as Step 1 names them, in any of the audio formats it can write
+TRACK_PATTERN = re.compile(r"_output_audio_track_(\d+)\.(mp3|wav|flac|m4a|mka|ogg|opus|ac3|eac3)$", re.IGNORECASE)
+
+
+def find_tracks(inputs):
+    # A single argument that is not a file is taken as the recording's base name, and
+    # only Step 1's track files are picked up next to it (not transcripts, chunks or
+    # manifests that share the prefix).  Files given explicitly that are not named like
+    # a track are numbered by their position.
+    tracks = []
+    if len(inputs) == 1 and not os.path.isfile(inputs[0]):
+        for path in glob.glob(glob.escape(inputs[0]) + "_output_audio_track_*"):
+            match = TRACK_PATTERN.search(path)
+            if match and match.start() == len(inputs[0]):
+                tracks.append((int(match.group(1)), path))
+    else:
+        for position, path in enumerate(inputs, start=1):
+            match = TRACK_PATTERN.search(path)
+            tracks.append((int(match.group(1)) if match else position, path))
+    tracks.sort()
+    numbers = [number for number, _ in tracks]
+    duplicates = sorted({number for number in numbers if numbers.count(number) > 1})
+    if duplicates:
+        raise ValueError("More than one file for track(s) " + ", ".join(map(str, duplicates)) + ": "
+                         + ", ".join(path for number, path in tracks if number in duplicates))
+    return tracks
+
+def track_speech_masks(tracks, bleed_margin_db=BLEED_MARGIN_DB):
+    # Frame masks of each track's own speech, on a shared frame grid.  A track that
+    # stops early (one microphone switched off first) is treated as silent from there
+    # on, so the others keep their speech to the end of the longest track.
+    frame_length = int(SAMPLE_RATE * FRAME_MS / 1000)
+    n_frames = max(len(audio) for audio in tracks) // frame_length
+    masks = []
+    energies = []
+    for audio in tracks:
+        # Unpadded frame decisions; padding and gap closing come after the bleed check
+        mask, _ = vad.speech_mask(audio, frame_ms=FRAME_MS, pad_ms=0, min_silence_ms=0, min_speech_ms=0)
+        energy_db, _ = vad.frame_features(audio, frame_length)
+        masks.append(np.pad(mask, (0, n_frames - len(mask)), constant_values=False))
+        energies.append(np.pad(energy_db, (0, n_frames - len(energy_db)), constant_values=SILENCE_DB))
+    loudest = np.stack(energies).max(axis=0)
+    return [vad.smooth_mask(mask & (energy_db > loudest - bleed_margin_db), FRAME_MS)
+            for mask, energy_db in zip(masks, energies)], frame_length
+
+def plan_track_chunks(tracks, labels, max_chunk=MAX_CHUNK, merge_gap=MERGE_GAP, bleed_margin_db=BLEED_MARGIN_DB):
+    masks, frame_length = track_speech_masks(tracks, bleed_margin_db)
+    chunks = []
+    for audio, label, mask in zip(tracks, labels, masks):
+        starts, ends = vad.runs(mask)
+        spans = [(start * frame_length / SAMPLE_RATE, end * frame_length / SAMPLE_RATE) for start, end in zip(starts, ends)]
+
+        # Join nearby spans into chunks; split a long monologue at its pauses
+        grouped = []
+        for start, end in spans:
+            if grouped and start - grouped[-1][1] <= merge_gap and end - grouped[-1][0] <= max_chunk:
+                grouped[-1][1] = end
+            else:
+                grouped.append([start, end])
+        for start, end in grouped:
+            piece = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+            bounds = [0.0] + vad.silence_cut_points(piece, max_chunk) + [end - start]
+            for piece_start, piece_end in zip(bounds[:-1], bounds[1:]):
+                chunk_start, chunk_end = start + piece_start, start + piece_end
+                chunks.append({
+                    "index": len(chunks),
+                    "start": chunk_start,
+                    "end": chunk_end,
+                    "offset": chunk_start,
+                    "audio": audio[int(chunk_start * SAMPLE_RATE):int(chunk_end * SAMPLE_RATE)],
+                    "track": label,
+                })
+    return chunks
+
+def merge_lanes(chunks, chunk_results):
+    track_of = {chunk["index"]: chunk["track"] for chunk in chunks}
+    segments = []
+    for chunk_result in chunk_results:
+        for segment in chunk_result["segments"]:
+            segment["track"] = track_of[chunk_result["index"]]
+            segments.append(segment)
+    segments.sort(key=lambda segment: (segment["start"], segment["end"]))
+    for index, segment in enumerate(segments):
+        segment["id"] = index
+    languages = [r["language"] for r in chunk_results if r.get("language")]
+    return {
+        "text": render_lanes(segments),
+        "segments": segments,
+        "language": max(set(languages), key=languages.count) if languages else None,
+    }
+
+def render_lanes(segments):
+    # One line per turn; consecutive segments from the same track are joined
+    lines = []
+    previous = None
+    for segment in segments:
+        if segment["track"] == previous:
+            lines[-1] += segment["text"]
+        else:
+            lines.append(f"[{segment_output.format_timestamp(segment['start'], '.')[:8]}] {segment['track']}:{segment['text']}")
+        previous = segment["track"]
+    return "\n".join(lines) + "\n" if lines else ""
+
+def labelled_segments(segments):
+    return [dict(segment, text=f"{segment['track']}: {segment['text'].strip()}") for segment in segments]
+
+def load_tracks(paths, feature_cache_directory=None):
+    # Each decode is its own ffmpeg process, so the tracks are decoded side by side
+    with ThreadPoolExecutor(max_workers=len(paths) or 1) as executor:
+        return list(executor.map(lambda path: transcribe.load_audio(path, feature_cache_directory), paths))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Transcribe every audio track of a recording and merge them by time.")
+    parser.add_argument("inputs", nargs="+", help="Track files, or the recording's base name to find its _output_audio_track_N files")
+    parser.add_argument("-o", "--output", default=transcribe.OUTPUT_PATH, help="Where to write the labelled transcript")
+    parser.add_argument("--json", default=None, help="Also write the merged segments, with their track, as JSON")
+    parser.add_argument("--srt", default=None, help="Also write SRT subtitles with the track label on every line")
+    parser.add_argument("--vtt", default=None, help="Also write WebVTT subtitles with the track label on every line")
+    parser.add_argument("--names", nargs="+", default=None, help="Labels for the tracks, in track order")
+    parser.add_argument("-m", "--model", default=transcribe.MODEL_NAME, help="Whisper model name")
+    parser.add_argument("-w", "--workers", type=int, default=transcribe_parallel.default_workers(), help="Worker processes")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--bleed-margin", type=float, default=BLEED_MARGIN_DB,
+                        help="dB below the loudest track at which a track's audio counts as bleed")
+    parser.add_argument("--share-model", action="store_true",
+                        help="Load the model once in shared memory instead of once per worker (CPU only)")
+    feature_cache.add_cache_argument(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        tracks = find_tracks(args.inputs)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if not tracks:
+        print(f"No tracks found for {' '.join(args.inputs)}", file=sys.stderr)
+        return 1
+    if args.names and len(args.names) != len(tracks):
+        print(f"--names gives {len(args.names)} label(s) for {len(tracks)} track(s)", file=sys.stderr)
+        return 1
+    labels = args.names or [f"Track {number}" for number, _ in tracks]
+
+    audio = load_tracks([path for _, path in tracks], args.feature_cache)
+    chunks = plan_track_chunks(audio, labels, bleed_margin_db=args.bleed_margin)
+    audio_seconds = max(len(track) for track in audio) / SAMPLE_RATE
+    speech_seconds = sum(chunk["end"] - chunk["start"] for chunk in chunks)
+    print(f"{len(tracks)} track(s), {audio_seconds:.0f}s each: transcribing {speech_seconds:.0f}s of speech "
+          f"out of {audio_seconds * len(tracks):.0f}s of audio as {len(chunks)} chunk(s)", file=sys.stderr)
+    if not chunks:
+        print("No speech found on any track.", file=sys.stderr)
+        return 1
+
+    workers = max(1, min(args.workers, len(chunks)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    start = time.time()
+    chunk_results = transcribe_parallel.run_chunks(chunks, args.model, workers, threads,
+                                                   feature_cache_directory=args.feature_cache,
+                                                   share_model=args.share_model)
+    elapsed = time.time() - start
+    print(f"Done in {elapsed:.1f}s ({audio_seconds * len(tracks) / elapsed:.1f}x realtime over all tracks)",
+          file=sys.stderr)
+
+    result = merge_lanes(chunks, chunk_results)
+    transcribe.write_text(result, args.output)
+    if args.json:
+        transcribe.write_json(result, args.json)
+    segment_output.write_subtitles(labelled_segments(result["segments"]), args.srt, args.vtt)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
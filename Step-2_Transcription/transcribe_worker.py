@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import datetime
+import traceback
+
+import whisper
+
+import transcribe
+import transcript_cache
+import feature_cache
+
+# A long-lived transcription worker.  The Whisper model is loaded once and then jobs are
+# taken from a spool directory, so a batch of 30 files pays for the model load once
+# instead of 30 times.
+#
+# The spool has four sub-directories:
+#   incoming/    job files waiting to be picked up
+#   processing/  jobs a worker has claimed (claiming is an atomic rename, so several
+#                workers can share one spool without taking the same job)
+#   done/        finished jobs, with timing added
+#   failed/      jobs that raised, with the error added
+#
+# A job file is JSON: {"audio": "/path/in.wav", "output": "/path/out.txt", "vad": false}
+#
+#   python transcribe_worker.py serve --spool spool --model large --feature-cache
+#   python transcribe_worker.py submit "Panel 1_output_audio_track_1.wav" -o "Panel 1.txt" --spool spool
+
+SPOOL_DIRECTORY = "spool"
+SPOOL_STATES = ("incoming", "processing", "done", "failed")
+POLL_INTERVAL = 2.0
+
+
+def ensure_spool(spool_directory):
+    for state in SPOOL_STATES:
+        os.makedirs(os.path.join(spool_directory, state), exist_ok=True)
+
+def submit_job(spool_directory, audio_path, output_path, use_vad=False):
+    ensure_spool(spool_directory)
+    job = {
+        "audio": os.path.abspath(audio_path),
+        "output": os.path.abspath(output_path),
+        "vad": use_vad,
+        "submitted": datetime.datetime.now().isoformat(),
+    }
+    # Names sort in submission order, which is the order workers pick jobs up in
+    job_name = f"{time.time_ns()}_{uuid.uuid4().hex[:8]}.json"
+    # Write under a temporary name first so a worker never reads a half-written job
+    temp_path = os.path.join(spool_directory, "incoming", "." + job_name)
+    with open(temp_path, "w") as f:
+        json.dump(job, f, indent=2)
+    os.replace(temp_path, os.path.join(spool_directory, "incoming", job_name))
+    return job_name
+
+def claim_next_job(spool_directory):
+    incoming = os.path.join(spool_directory, "incoming")
+    for job_name in sorted(os.listdir(incoming)):
+        if job_name.startswith(".") or not job_name.endswith(".json"):
+            continue
+        claimed = os.path.join(spool_directory, "processing", job_name)
+        try:
+            os.rename(os.path.join(incoming, job_name), claimed)
+        except FileNotFoundError:
+            # Another worker got there first
+            continue
+        return claimed
+    return None
+
+def finish_job(spool_directory, job_path, job, state):
+    with open(job_path, "w") as f:
+        json.dump(job, f, indent=2)
+    os.replace(job_path, os.path.join(spool_directory, state, os.path.basename(job_path)))
+
+def run_job(model, model_name, job, cache_directory=None, feature_cache_directory=None):
+    # With a feature cache, a job moved back to incoming/ after a failure is not decoded twice
+    audio = transcribe.load_audio(job["audio"], feature_cache_directory)
+
+    # The same key transcribe.py uses, so the two share cache entries
+    settings = transcribe.settings_for("vad" if job.get("vad") else "whole")
+
+    def run():
+        if settings["mode"] == "vad":
+            return transcribe.transcribe_speech_only(model, audio, **settings["transcribe_options"])
+        return transcribe.transcribe_audio(model, audio, **settings["transcribe_options"])
+
+    if cache_directory:
+        result, job["cached"] = transcribe.transcribe_with_cache(audio, model_name, cache_directory, settings, run)
+    else:
+        result = run()
+    output_directory = os.path.dirname(job["output"])
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+    transcribe.write_text(result, job["output"])
+    return len(audio) / whisper.audio.SAMPLE_RATE
+
+def serve(spool_directory, model_name, once=False, poll_interval=POLL_INTERVAL,
+          cache_directory=transcript_cache.CACHE_DIRECTORY, feature_cache_directory=None):
+    ensure_spool(spool_directory)
+    leftover = os.listdir(os.path.join(spool_directory, "processing"))
+    if leftover:
+        print(f"Note: {len(leftover)} job(s) in {spool_directory}/processing were left by an earlier worker; "
+              "move them back to incoming/ to retry them.")
+
+    start = time.time()
+    model = whisper.load_model(model_name)
+    print(f"Loaded model '{model_name}' in {time.time() - start:.1f}s; waiting for jobs in {spool_directory}/incoming")
+
+    completed = failed = 0
+    while True:
+        job_path = claim_next_job(spool_directory)
+        if job_path is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        with open(job_path) as f:
+            job = json.load(f)
+        job["worker"] = f"{socket.gethostname()}:{os.getpid()}"
+        job["model"] = model_name
+        job["started"] = datetime.datetime.now().isoformat()
+        print(f"Transcribing {job['audio']}")
+        job_start = time.time()
+        try:
+            audio_seconds = run_job(model, model_name, job, cache_directory, feature_cache_directory)
+        except Exception as e:
+            job["error"] = f"{type(e).__name__}: {e}"
+            job["traceback"] = traceback.format_exc()
+            finish_job(spool_directory, job_path, job, "failed")
+            failed += 1
+            print(f"Failed {job['audio']}: {job['error']}")
+            continue
+
+        elapsed = time.time() - job_start
+        job["audio_seconds"] = round(audio_seconds, 2)
+        job["wall_seconds"] = round(elapsed, 2)
+        job["finished"] = datetime.datetime.now().isoformat()
+        finish_job(spool_directory, job_path, job, "done")
+        completed += 1
+        print(f"Finished {job['audio']} in {elapsed:.1f}s ({audio_seconds / elapsed:.1f}x realtime) -> {job['output']}")
+
+    print(f"Queue empty: {completed} job(s) done, {failed} failed")
+    if cache_directory:
+        print(transcript_cache.report(cache_directory))
+    if feature_cache_directory:
+        print(feature_cache.report(feature_cache_directory))
+    return 1 if failed else 0
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Resident Whisper worker fed from a spool directory.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Load the model once and process jobs")
+    serve_parser.add_argument("--spool", default=SPOOL_DIRECTORY, help="Spool directory")
+    serve_parser.add_argument("-m", "--model", default=transcribe.MODEL_NAME, help="Whisper model name")
+    serve_parser.add_argument("--once", action="store_true", help="Exit when the queue is empty instead of polling")
+    serve_parser.add_argument("--cache-dir", default=transcript_cache.CACHE_DIRECTORY, help="Transcript cache directory")
+    serve_parser.add_argument("--no-cache", action="store_true", help="Always transcribe, ignoring the transcript cache")
+    feature_cache.add_cache_argument(serve_parser)
+    serve_parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="Seconds between queue checks")
+
+    submit_parser = subparsers.add_parser("submit", help="Queue audio files for transcription")
+    submit_parser.add_argument("audio", nargs="+", help="Audio files to transcribe")
+    submit_parser.add_argument("-o", "--output", default=None,
+                               help="Output path (single file) or directory (several files); default: next to the audio")
+    submit_parser.add_argument("--spool", default=SPOOL_DIRECTORY, help="Spool directory")
+    submit_parser.add_argument("--vad", action="store_true", help="Skip non-speech before transcribing")
+    return parser.parse_args(argv)
+
+def output_path_for(audio_path, output, several):
+    base_name = os.path.splitext(os.path.basename(audio_path))[0] + "_transcription.txt"
+    if output is None:
+        return os.path.join(os.path.dirname(os.path.abspath(audio_path)), base_name)
+    if several or os.path.isdir(output):
+        return os.path.join(output, base_name)
+    return output
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command == "serve":
+        return serve(args.spool, args.model, args.once, args.poll, None if args.no_cache else args.cache_dir,
+                     args.feature_cache)
+
+    several = len(args.audio) > 1
+    for audio_path in args.audio:
+        job_name = submit_job(args.spool, audio_path, output_path_for(audio_path, args.output, several), args.vad)
+        print(f"Queued {audio_path} as {job_name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
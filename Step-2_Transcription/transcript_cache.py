@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import hashlib
+
+import cache_files
+
+# A content-addressed cache of transcription results.  The key is a hash of the decoded
+# 16 kHz audio together with the model name and decode options, so a re-export or a
+# duplicate upload under a new name is recognised as the same audio and never goes
+# through Whisper twice.
+#
+# Entries are JSON files named by key.  A hit touches the entry's modification time,
+# and when the cache grows past its size limit the least recently used entries are
+# removed first.  Hit and miss counts are kept in stats.json for the report.
+
+CACHE_DIRECTORY = os.getenv("WHISPER_TRANSCRIPT_CACHE", os.path.expanduser("~/.cache/whisper-ai/transcripts"))
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+STATS_FILENAME = "stats.json"
+
+
+def cache_key(audio, model_name, options):
+    digest = hashlib.sha256()
+    digest.update(audio.tobytes())
+    digest.update(model_name.encode("utf-8"))
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def entry_path(cache_directory, key):
+    return os.path.join(cache_directory, key[:2], key + ".json")
+
+def cache_get(cache_directory, key):
+    path = entry_path(cache_directory, key)
+    try:
+        with open(path) as f:
+            result = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        record_lookup(cache_directory, hit=False)
+        return None
+    os.utime(path)
+    record_lookup(cache_directory, hit=True)
+    return result
+
+def cache_put(cache_directory, key, result, max_bytes=MAX_CACHE_BYTES):
+    path = entry_path(cache_directory, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + f".{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+    evict(cache_directory, max_bytes)
+
+def list_entries(cache_directory):
+    return cache_files.list_entries(cache_directory, (".json",), exclude=(STATS_FILENAME,))
+
+def evict(cache_directory, max_bytes=MAX_CACHE_BYTES):
+    evicted = cache_files.evict(cache_directory, max_bytes, (".json",), exclude=(STATS_FILENAME,))
+    if evicted:
+        update_stats(cache_directory, evictions=evicted)
+    return evicted
+
+def load_stats(cache_directory):
+    try:
+        with open(os.path.join(cache_directory, STATS_FILENAME)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"hits": 0, "misses": 0, "evictions": 0}
+
+def update_stats(cache_directory, **increments):
+    os.makedirs(cache_directory, exist_ok=True)
+    stats = load_stats(cache_directory)
+    for name, value in increments.items():
+        stats[name] = stats.get(name, 0) + value
+    stats["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    path = os.path.join(cache_directory, STATS_FILENAME)
+    temp_path = path + f".{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(stats, f, indent=2)
+    os.replace(temp_path, path)
+
+def record_lookup(cache_directory, hit):
+    update_stats(cache_directory, **({"hits": 1} if hit else {"misses": 1}))
+
+def report(cache_directory):
+    stats = load_stats(cache_directory)
+    entries = list_entries(cache_directory)
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    hit_rate = f"{100 * stats.get('hits', 0) / lookups:.0f}%" if lookups else "n/a"
+    size_mb = sum(size for _, size, _ in entries) / (1024 * 1024)
+    return (f"Transcript cache {cache_directory}: {len(entries)} entries, {size_mb:.1f} MB, "
+            f"{stats.get('hits', 0)} hits / {stats.get('misses', 0)} misses ({hit_rate}), "
+            f"{stats.get('evictions', 0)} evicted")
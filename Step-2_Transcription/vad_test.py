@@ -0,0 +1,73 @@
+import numpy as np
+
+import vad
+from checks import check, finish
+
+# Voice activity trimming, the offset map back onto the recording, and chunk cut points,
+# on tone bursts over a quiet noise floor so the true speech spans are known.
+#   python vad_test.py
+
+SAMPLE_RATE = vad.SAMPLE_RATE
+SPEECH = [(2.0, 5.0), (10.0, 12.5), (20.0, 26.0)]
+
+
+def synthetic(spans, duration):
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 0.001, int(duration * SAMPLE_RATE)).astype(np.float32)
+    t = np.arange(len(audio)) / SAMPLE_RATE
+    for start, end in spans:
+        inside = (t >= start) & (t < end)
+        audio[inside] += (0.3 * np.sin(2 * np.pi * 220 * t[inside])).astype(np.float32)
+    return audio
+
+def main():
+    audio = synthetic(SPEECH, 30.0)
+    trimmed, offset_map = vad.trim_to_speech(audio)
+
+    # Spans are padded by 200 ms and rounded to 30 ms frames
+    ok = check(f"one span per burst, padded around it ({len(offset_map)} spans)",
+               len(offset_map) == len(SPEECH)
+               and all(start - 0.25 <= original <= start and end <= original + duration <= end + 0.25
+                       for (start, end), (_, original, duration) in zip(SPEECH, offset_map)))
+    trimmed_starts = [entry[0] for entry in offset_map]
+    ok &= check("trimmed spans follow each other without gaps",
+                trimmed_starts == [0.0] + list(np.cumsum([entry[2] for entry in offset_map])[:-1])
+                and abs(len(trimmed) / SAMPLE_RATE - sum(entry[2] for entry in offset_map)) < 1e-9)
+
+    inside = offset_map[1][0] + 1.0
+    ok &= check("a time inside a span maps to the same place in the recording",
+                abs(float(vad.map_times([inside], offset_map)[0]) - (offset_map[1][1] + 1.0)) < 1e-9)
+
+    join = offset_map[1][0]
+    segments = [
+        {"start": 0.5, "end": join, "words": [{"start": 0.5, "end": 1.0}]},
+        {"start": join, "end": join + 1.0, "words": [{"start": join, "end": join + 0.5}]},
+    ]
+    vad.remap_segments(segments, offset_map)
+    first_span_end = offset_map[0][1] + offset_map[0][2]
+    ok &= check("a segment ending on a join stays with the span before it",
+                abs(segments[0]["end"] - round(first_span_end, 3)) <= 1e-3
+                and segments[0]["start"] == round(offset_map[0][1] + 0.5, 3))
+    ok &= check("a segment starting on a join moves to the next span, words included",
+                segments[1]["start"] == round(offset_map[1][1], 3)
+                and segments[1]["words"][0]["start"] == round(offset_map[1][1], 3)
+                and segments[1]["words"][0]["end"] == round(offset_map[1][1] + 0.5, 3))
+
+    silent, silent_map = vad.trim_to_speech(np.zeros(SAMPLE_RATE * 5, dtype=np.float32))
+    ok &= check("silence trims to nothing", len(silent) == 0 and silent_map == [])
+
+    # 15 s of speech then 5 s of pause, over five minutes
+    bursts = [(start, start + 15.0) for start in range(0, 300, 20)]
+    cuts = vad.silence_cut_points(synthetic(bursts, 300.0), max_chunk=60.0)
+    bounds = [0.0] + cuts + [300.0]
+    ok &= check(f"cuts keep every chunk within 60 s ({len(cuts)} cuts)",
+                all(0 < end - start <= 60.0 for start, end in zip(bounds[:-1], bounds[1:])))
+    ok &= check("every cut lands in a pause", all(cut % 20 > 15.0 for cut in cuts))
+
+    cuts = vad.silence_cut_points(synthetic([(0.0, 150.0)], 150.0), max_chunk=60.0)
+    ok &= check(f"speech with no pause is cut hard at the limit ({cuts})", cuts == [60.0, 120.0])
+
+    return finish(ok)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
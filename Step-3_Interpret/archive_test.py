@@ -0,0 +1,62 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "not-used")
+
+import transcribe_summarize_013 as batch
+from fake_drive import FakeDrive, check, finish
+
+# Archive moves: a batch of transcripts must be moved in a handful of batch requests
+# using the parents from the listing, calls that fail with a server error must be
+# retried, and a doc that cannot be moved must fail only its own result.
+#   python archive_test.py
+
+
+def main():
+    # Backoff waits are recorded instead of slept.  time is the shared module, so the
+    # real sleep goes back even if a check raises.
+    sleeps = []
+    real_sleep = batch.time.sleep
+    batch.time.sleep = sleeps.append
+    try:
+        return run_checks(sleeps)
+    finally:
+        batch.time.sleep = real_sleep
+
+def run_checks(sleeps):
+    drive = FakeDrive(max_page_size=100)
+    folder = drive.add_folder("recordings")
+    archive = drive.add_folder("archive")
+    docs = [drive.add_file(f"Panel {i}", folder) for i in range(250)]
+    listed = batch.list_google_docs_files(drive, folder)
+
+    drive.fail_next = {docs[10]: 1, docs[120]: 2}
+    calls = drive.calls
+    errors = batch.move_files_to_folder(drive, listed, archive)
+    ok = check(f"250 moves took {drive.calls - calls} call(s)", drive.calls - calls == 5)
+    ok &= check("every doc was moved, retries included",
+                not errors and all(drive.store[file_id]['parents'] == [archive] for file_id in docs))
+    ok &= check(f"retries backed off ({sleeps})", sleeps == [batch.DRIVE_BATCH_BACKOFF, 2 * batch.DRIVE_BATCH_BACKOFF])
+
+    # Bare ids have their parents looked up in batches first
+    more = [drive.add_file(f"Late panel {i}", folder) for i in range(5)]
+    calls = drive.calls
+    errors = batch.move_files_to_folder(drive, more, archive)
+    ok &= check("bare ids are looked up and moved in two calls",
+                not errors and drive.calls - calls == 2 and all(drive.store[f]['parents'] == [archive] for f in more))
+
+    # One doc was deleted after listing; only its result fails
+    last = [drive.add_file(f"Final panel {i}", folder) for i in range(3)]
+    listed = batch.list_google_docs_files(drive, folder)
+    del drive.store[last[1]]
+    results = [{"file_id": f['id'], "file_name": f['name'], "status": "success", "error": ""} for f in listed]
+    results.append({"file_id": "failed-earlier", "file_name": "x", "status": "failed", "error": "Download failed"})
+    batch.archive_transcripts(drive, results, listed, archive)
+    statuses = {r['file_id']: r['status'] for r in results}
+    ok &= check("a doc that cannot be moved fails alone, without retries",
+                statuses == {last[0]: 'success', last[1]: 'failed', last[2]: 'success', "failed-earlier": 'failed'}
+                and len(sleeps) == 2)
+
+    return finish(ok)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
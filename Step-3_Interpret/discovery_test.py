@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+os.environ.setdefault("OPENAI_API_KEY", "not-used")
+
+import transcribe_summarize_013 as batch
+from fake_drive import FakeDrive, check, finish
+
+# Transcript discovery: the full listing must follow nextPageToken, and incremental
+# runs must see only new docs plus the ones that failed last time, at a cost that does
+# not grow with the folder.
+#   python discovery_test.py
+
+
+def main():
+    drive = FakeDrive(max_page_size=100)
+    folder = drive.add_folder("recordings")
+    archive = drive.add_folder("archive")
+    docs = [drive.add_file(f"Panel {i}", folder) for i in range(1500)]
+    drive.add_file("slides.pdf", folder, "application/pdf")
+
+    calls = drive.calls
+    ok = check("full listing follows nextPageToken past 1000 docs",
+               len(batch.list_google_docs_files(drive, folder)) == 1500)
+    listing_calls = drive.calls - calls
+
+    state_path = os.path.join(tempfile.mkdtemp(), "drive_discovery_state.json")
+    state = batch.load_discovery_state(state_path)
+    found = batch.discover_transcripts(drive, [folder], state)
+    ok &= check("first incremental run lists the whole folder", len(found[folder]) == 1500)
+
+    # The batch archives everything except one doc that failed
+    for file_id in docs[1:]:
+        drive.move(file_id, archive)
+    state["pending"] = {folder: [docs[0]]}
+    batch.save_discovery_state(state, state_path)
+
+    # The archive moves are changes as well, so this run reads them once
+    new_docs = [drive.add_file(f"New panel {i}", folder) for i in range(3)]
+    drive.trash(new_docs[2])
+    drive.add_file("Elsewhere", archive)
+
+    state = batch.load_discovery_state(state_path)
+    found = batch.discover_transcripts(drive, [folder], state)
+    ids = {file['id'] for file in found[folder]}
+    ok &= check("second run sees new docs and the failed one, not trashed or foreign docs",
+                ids == {docs[0], new_docs[0], new_docs[1]})
+
+    state["pending"] = {folder: []}
+    batch.save_discovery_state(state, state_path)
+    state = batch.load_discovery_state(state_path)
+    found = batch.discover_transcripts(drive, [folder], state)
+    ok &= check("a run with no changes finds nothing", found[folder] == [])
+
+    latest = drive.add_file("Latest panel", folder)
+    calls = drive.calls
+    found = batch.discover_transcripts(drive, [folder], state)
+    ok &= check(f"a run with one new doc used {drive.calls - calls} call(s); "
+                f"listing the 1500 docs took {listing_calls}",
+                [file['id'] for file in found[folder]] == [latest] and drive.calls - calls == 1)
+
+    return finish(ok)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
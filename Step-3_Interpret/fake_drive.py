@@ -0,0 +1,216 @@
+import re
+import itertools
+import threading
+
+# An in-memory stand-in for the parts of the Drive v3 API that the batch uses, so
+# discovery and archiving can be exercised without a service account or network.
+# Every create, update and move is also recorded as a change, which makes the changes
+# feed (getStartPageToken / changes.list) behave like Drive's: a page token is a
+# position in that log.  max_page_size is kept small by default so pagination is
+# always exercised.  The check scripts in this folder (*_test.py) run against it and
+# report through check() and finish() at the bottom.
+#
+# A batch request (new_batch_http_request) counts as one call however many requests it
+# carries, like Drive's single HTTP round trip.  fail_next maps a file id to a number
+# of updates of it that fail with a 503 first, to exercise retries.
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+DOC_MIME_TYPE = 'application/vnd.google-apps.document'
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status, content=b''):
+        super().__init__(f"HTTP {status}")
+        self.resp = type('Response', (), {'status': status})()
+        self.content = content
+
+class FakeRequest:
+    def __init__(self, drive, run):
+        self.drive = drive
+        self.run = run
+
+    def execute(self):
+        with self.drive.lock:
+            self.drive.calls += 1
+            return self.run()
+
+class FakeBatch:
+    def __init__(self, drive, callback=None):
+        self.drive = drive
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self.requests) == 100:
+            raise ValueError("A batch holds at most 100 requests")
+        self.requests.append((request_id or str(len(self.requests) + 1), request, callback or self.callback))
+
+    def execute(self):
+        with self.drive.lock:
+            self.drive.calls += 1
+            self.drive.batches += 1
+            for request_id, request, callback in self.requests:
+                try:
+                    response, exception = request.run(), None
+                except Exception as e:
+                    response, exception = None, e
+                if callback:
+                    callback(request_id, response, exception)
+
+class FakeFiles:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q='', pageSize=100, pageToken=None, fields=None, **kwargs):
+        def run():
+            matches = [f for f in self.drive.store.values() if self.drive.matches(f, q)]
+            start = int(pageToken or 0)
+            page = matches[start:start + min(pageSize, self.drive.max_page_size)]
+            result = {'files': [self.drive.metadata(f) for f in page]}
+            if start + len(page) < len(matches):
+                result['nextPageToken'] = str(start + len(page))
+            return result
+        return FakeRequest(self.drive, run)
+
+    def get(self, fileId, fields=None, **kwargs):
+        return FakeRequest(self.drive, lambda: self.drive.metadata(self.drive.lookup(fileId)))
+
+    def create(self, body, media_body=None, fields=None, **kwargs):
+        def run():
+            content = self.drive.media_content(media_body) or b''
+            file_id = self.drive.add_file(body['name'], body.get('parents', [None])[0],
+                                          body.get('mimeType', 'application/octet-stream'), content)
+            return {'id': file_id}
+        return FakeRequest(self.drive, run)
+
+    def update(self, fileId, body=None, addParents=None, removeParents=None, media_body=None, fields=None, **kwargs):
+        def run():
+            file = self.drive.lookup(fileId)
+            if self.drive.fail_next.get(fileId):
+                self.drive.fail_next[fileId] -= 1
+                raise FakeHttpError(503, b'backendError')
+            if removeParents:
+                file['parents'] = [p for p in file['parents'] if p not in removeParents.split(',')]
+            if addParents:
+                file['parents'] += [p for p in addParents.split(',') if p not in file['parents']]
+            if body:
+                file.update({key: value for key, value in body.items() if key in ('name', 'trashed')})
+            if media_body is not None:
+                file['content'] = self.drive.media_content(media_body)
+            self.drive.record_change(file)
+            return self.drive.metadata(file)
+        return FakeRequest(self.drive, run)
+
+    def get_media(self, fileId, **kwargs):
+        return FakeRequest(self.drive, lambda: self.drive.lookup(fileId)['content'])
+
+class FakeChanges:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(self.drive, lambda: {'startPageToken': str(len(self.drive.change_log))})
+
+    def list(self, pageToken, pageSize=100, fields=None, **kwargs):
+        def run():
+            start = int(pageToken)
+            page = self.drive.change_log[start:start + min(pageSize, self.drive.max_page_size)]
+            result = {'changes': [dict(change, file=dict(change['file'])) for change in page]}
+            if start + len(page) < len(self.drive.change_log):
+                result['nextPageToken'] = str(start + len(page))
+            else:
+                result['newStartPageToken'] = str(len(self.drive.change_log))
+            return result
+        return FakeRequest(self.drive, run)
+
+class FakeDrive:
+    def __init__(self, max_page_size=100):
+        self.max_page_size = max_page_size
+        self.store = {}
+        self.change_log = []
+        self.calls = 0
+        self.batches = 0
+        self.fail_next = {}
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+
+    # The service interface
+    def files(self):
+        return FakeFiles(self)
+
+    def changes(self):
+        return FakeChanges(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    # Test helpers
+    def add_file(self, name, parent, mime_type=DOC_MIME_TYPE, content=b''):
+        with self.lock:
+            file_id = f"fake{next(self.ids)}"
+            self.store[file_id] = {'id': file_id, 'name': name, 'mimeType': mime_type, 'parents': [parent] if parent else [],
+                                   'trashed': False, 'content': content}
+            self.record_change(self.store[file_id])
+            return file_id
+
+    def add_folder(self, name, parent=None):
+        return self.add_file(name, parent, FOLDER_MIME_TYPE)
+
+    def trash(self, file_id):
+        with self.lock:
+            self.store[file_id]['trashed'] = True
+            self.record_change(self.store[file_id])
+
+    def move(self, file_id, new_parent):
+        with self.lock:
+            self.store[file_id]['parents'] = [new_parent]
+            self.record_change(self.store[file_id])
+
+    def children(self, folder_id):
+        return [f for f in self.store.values() if folder_id in f['parents'] and not f['trashed']]
+
+    # Internals
+    def lookup(self, file_id):
+        if file_id not in self.store:
+            raise KeyError(f"File not found: {file_id}")
+        return self.store[file_id]
+
+    def metadata(self, file):
+        return {key: (list(value) if isinstance(value, list) else value)
+                for key, value in file.items() if key != 'content'}
+
+    def media_content(self, media_body):
+        if media_body is None:
+            return None
+        if hasattr(media_body, 'getbytes'):
+            return media_body.getbytes(0, media_body.size())
+        return media_body.body
+
+    def record_change(self, file):
+        self.change_log.append({'fileId': file['id'], 'removed': False, 'file': self.metadata(file)})
+
+    def matches(self, file, q):
+        parent = re.search(r"'([^']+)' in parents", q)
+        if parent and parent.group(1) not in file['parents']:
+            return False
+        name = re.search(r"name = '([^']+)'", q)
+        if name and file['name'] != name.group(1):
+            return False
+        name_prefix = re.search(r"name contains '([^']+)'", q)
+        if name_prefix and not file['name'].startswith(name_prefix.group(1)):
+            return False
+        mime_type = re.search(r"mimeType = '([^']+)'", q)
+        if mime_type and file['mimeType'] != mime_type.group(1):
+            return False
+        if "trashed = false" in q.replace("trashed=false", "trashed = false") and file['trashed']:
+            return False
+        return True
+
+
+def check(label, condition):
+    print(f"{'ok  ' if condition else 'FAIL'} {label}")
+    return condition
+
+def finish(ok):
+    print("All checks passed." if ok else "Some checks FAILED.")
+    return 0 if ok else 1
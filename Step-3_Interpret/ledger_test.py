@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import tempfile
+
+os.environ.setdefault("OPENAI_API_KEY", "not-used")
+
+import transcribe_summarize_013 as batch
+from fake_drive import FakeDrive, check, finish
+
+# Run ledger: recording a batch must cost the same number of calls however much history
+# exists, compaction must fold shards into one file per month without losing or
+# doubling rows, and the SQLite mirror must hold every row.
+#   python ledger_test.py
+
+
+def entries(batch_number, count=20):
+    return [{"file_id": f"doc{batch_number}-{i}", "file_name": f"Panel {i}", "status": "success", "error": ""}
+            for i in range(count)]
+
+def ledger_rows(drive, logs):
+    # Every row of the live ledger files, as a reader would merge them
+    rows = {}
+    for file in batch.list_ledger_files(drive, logs, batch.LEDGER_MONTH_PREFIX):
+        for row in batch.read_ledger_file(drive, file['id']):
+            rows.setdefault((row['shard'], row['original_file_id']), row)
+    return rows
+
+def main():
+    db_path = os.path.join(tempfile.mkdtemp(), "run_ledger.sqlite")
+    batch.LEDGER_COMPACT_SHARDS = 10
+    drive = FakeDrive(max_page_size=100)
+    logs = drive.add_folder("logs")
+
+    costs = []
+    for batch_number in range(95):
+        calls = drive.calls
+        batch.record_batch_in_ledger(drive, logs, entries(batch_number), f"batch{batch_number}", "recordings", db_path)
+        costs.append(drive.calls - calls)
+    plain = [cost for cost in costs if cost == costs[0]]
+    ok = check(f"a batch costs {costs[0]} calls, the same after {len(costs)} batches",
+               costs[-1] == costs[0] and len(plain) >= 85)
+    compactions = [cost - costs[0] for cost in costs if cost != costs[0]]
+    ok &= check(f"compacting 10 shards costs {compactions[-1]} more calls, the same each time after the first",
+                len(compactions) == 9 and len(set(compactions[1:])) == 1
+                and compactions[-1] <= batch.LEDGER_COMPACT_SHARDS + 4)
+
+    rows = ledger_rows(drive, logs)
+    ok &= check(f"the ledger holds all {len(rows)} rows once", len(rows) == 95 * 20)
+    live = batch.list_ledger_files(drive, logs, batch.LEDGER_MONTH_PREFIX)
+    ok &= check(f"{len(live)} live ledger file(s): one month file and the uncompacted shards",
+                len(live) == 1 + 95 % 10)
+
+    # Shards from two months go to their own month files
+    for month in ("20250101-120000", "20250201-120000"):
+        shard = f"{batch.LEDGER_SHARD_PREFIX}{month}_old.csv"
+        batch.write_ledger_file(drive, logs, shard, batch.ledger_rows(entries(month, 5), "old", "recordings", shard, month))
+    shards = batch.list_ledger_files(drive, logs, batch.LEDGER_SHARD_PREFIX)
+    batch.compact_ledger(drive, logs, shards, db_path)
+    names = [file['name'] for file in batch.list_ledger_files(drive, logs, batch.LEDGER_MONTH_PREFIX)]
+    ok &= check("compaction writes one file per month",
+                sum(name.startswith("file_move_log_2025-01_") for name in names) == 1
+                and sum(name.startswith("file_move_log_2025-02_") for name in names) == 1
+                and not any(name.startswith(batch.LEDGER_SHARD_PREFIX) for name in names))
+
+    # Two runs compacting the same shards at once: both generations survive, and a
+    # reader still sees every row once
+    shard = f"{batch.LEDGER_SHARD_PREFIX}20250301-120000_race.csv"
+    batch.write_ledger_file(drive, logs, shard, batch.ledger_rows(entries("race", 5), "race", "recordings", shard, "x"))
+    shards = batch.list_ledger_files(drive, logs, batch.LEDGER_SHARD_PREFIX)
+    batch.compact_ledger(drive, logs, shards, db_path)
+    batch.compact_ledger(drive, logs, shards, db_path)
+    rows = ledger_rows(drive, logs)
+    ok &= check("concurrent compactions neither lose nor double rows", len(rows) == 95 * 20 + 3 * 5)
+
+    db = sqlite3.connect(db_path)
+    mirrored = db.execute("SELECT COUNT(*) FROM moves").fetchone()[0]
+    db.close()
+    ok &= check(f"the SQLite mirror holds all {mirrored} rows", mirrored == len(rows))
+
+    return finish(ok)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,14 +7,18 @@ import logging
 import ast
 import datetime
 import csv
-from functools import wraps
+import sqlite3
+import asyncio
+import threading
+from functools import wraps, partial
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from dotenv import load_dotenv
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
+from google.auth.transport.requests import Request
 from googleapiclient.http import MediaIoBaseDownload, MediaInMemoryUpload
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 # === LOGGING CONFIGURATION ===
 logger = logging.getLogger(__name__)
@@ -37,8 +41,35 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4.1-2025-04-14")
 MAX_TOKENS = 16000
 
+# "async" runs every transcript of every folder through one asyncio pipeline;
+# "threads" keeps the original one-thread-per-transcript batch
+PIPELINE_ENGINE = os.getenv("PIPELINE_ENGINE", "async")
+# How many transcripts each pipeline stage may work on at once
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "16"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+
+# Drive accepts up to 100 calls in one batch request.  Calls in a batch that fail with
+# a rate limit, server or connection error are retried in a new batch with backoff.
+DRIVE_BATCH_SIZE = 100
+DRIVE_BATCH_RETRIES = 4
+DRIVE_BATCH_BACKOFF = 2
+
+# "full" lists every recording folder on each run; "changes" lists them once, then
+# reads only Drive's changes feed from where the previous run stopped.  The feed
+# position and the docs that failed last time are kept in DISCOVERY_STATE_FILE.
+DISCOVERY_MODE = os.getenv("DISCOVERY_MODE", "full")
+DISCOVERY_STATE_FILE = os.getenv("DISCOVERY_STATE_FILE", "drive_discovery_state.json")
+GOOGLE_DOC_MIME_TYPE = 'application/vnd.google-apps.document'
+
+# The run ledger (see record_batch_in_ledger) is compacted once this many batch shards
+# have collected; every row is also kept in a local SQLite mirror for queries
+LEDGER_COMPACT_SHARDS = int(os.getenv("LEDGER_COMPACT_SHARDS", "50"))
+LEDGER_DB_FILE = os.getenv("LEDGER_DB_FILE", "run_ledger.sqlite")
+
 # === OPENAI CLIENT ===
 client = OpenAI(api_key=OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
 # === INSTRUCTIONS ===
 SUMMARY_INSTRUCTIONS = """
@@ -185,20 +216,152 @@ def sanitize_filename(value):
     value = re.sub(r'[\s-]+', '_', value)
     return value.strip()[:80]
 
+# === DRIVE CLIENTS ===
+# The service-account credentials are read and their first token fetched once per
+# process; every Drive service shares them and refreshes them as they expire.  A Drive
+# service wraps an httplib2 connection, which must not be used by two threads at once,
+# so each thread builds one service on first use and keeps it for the rest of the run.
+SCOPES = ['https://www.googleapis.com/auth/drive']
+drive_credentials = None
+drive_credentials_lock = threading.Lock()
+drive_local = threading.local()
+
+def get_drive_credentials():
+    global drive_credentials
+    with drive_credentials_lock:
+        if drive_credentials is None:
+            drive_credentials = service_account.Credentials.from_service_account_file(
+                SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+            drive_credentials.refresh(Request())
+        return drive_credentials
+
 @log_execution_time
 def authenticate_google_drive():
-    SCOPES = ['https://www.googleapis.com/auth/drive']
-    creds = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    return build('drive', 'v3', credentials=get_drive_credentials(), cache_discovery=False)
+
+def thread_drive_service():
+    if getattr(drive_local, "service", None) is None:
+        drive_local.service = authenticate_google_drive()
+    return drive_local.service
+
+def call_with_drive(func, *args):
+    return func(thread_drive_service(), *args)
 
 @log_execution_time
 def list_google_docs_files(service, folder_id):
-    results = service.files().list(
-        q=f"'{folder_id}' in parents and mimeType = 'application/vnd.google-apps.document' and trashed = false",
-        pageSize=1000, fields="files(id, name)", supportsAllDrives=True
-    ).execute()
-    return results.get('files', [])
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=f"'{folder_id}' in parents and mimeType = '{GOOGLE_DOC_MIME_TYPE}' and trashed = false",
+            pageSize=1000, fields="nextPageToken, files(id, name, parents)", pageToken=page_token,
+            supportsAllDrives=True, includeItemsFromAllDrives=True
+        ).execute()
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files
+
+# === INCREMENTAL DISCOVERY ===
+# Drive's changes feed lists every file created, modified, moved or trashed since a
+# page token, so a scheduled run costs a call per page of changes rather than a call
+# per page of folder contents.  There is one feed per shared drive (and one for the
+# service account's own drive), so folders are grouped by the drive they live in.
+def load_discovery_state(path=DISCOVERY_STATE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"folder_drives": {}, "start_page_tokens": {}, "pending": {}}
+
+def save_discovery_state(state, path=DISCOVERY_STATE_FILE):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, path)
+
+def drive_kwargs(drive_id):
+    return {'driveId': drive_id} if drive_id else {}
+
+def get_start_page_token(service, drive_id=None):
+    return service.changes().getStartPageToken(
+        supportsAllDrives=True, **drive_kwargs(drive_id)
+    ).execute()['startPageToken']
+
+@log_execution_time
+def list_changed_google_docs(service, page_token, drive_id=None):
+    # Returns the docs changed since page_token, latest state of each, and the token
+    # to start from next time
+    changed = {}
+    while True:
+        results = service.changes().list(
+            pageToken=page_token, spaces='drive', pageSize=1000,
+            fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, mimeType, parents, trashed))",
+            supportsAllDrives=True, includeItemsFromAllDrives=True, **drive_kwargs(drive_id)
+        ).execute()
+        for change in results.get('changes', []):
+            file = change.get('file')
+            if change.get('removed') or not file or file.get('trashed') or file.get('mimeType') != GOOGLE_DOC_MIME_TYPE:
+                changed.pop(change.get('fileId'), None)
+            else:
+                changed[file['id']] = file
+        if 'newStartPageToken' in results:
+            return list(changed.values()), results['newStartPageToken']
+        page_token = results['nextPageToken']
+
+def get_pending_doc(service, file_id, folder_id):
+    try:
+        file = service.files().get(
+            fileId=file_id, fields='id, name, parents, trashed', supportsAllDrives=True
+        ).execute()
+    except Exception as e:
+        logger.warning(f"Dropping pending doc {file_id}: {e}")
+        return None
+    if file.get('trashed') or folder_id not in file.get('parents', []):
+        return None
+    return file
+
+@log_execution_time
+def discover_transcripts(service, folder_ids, state=None):
+    # Docs to process per recording folder.  Without a state every folder is listed;
+    # with one, only the changes feed is read once a folder's drive has a start token.
+    if state is None:
+        return {folder_id: list_google_docs_files(service, folder_id) for folder_id in folder_ids}
+
+    found = {folder_id: {} for folder_id in folder_ids}
+    drives = {}
+    for folder_id in folder_ids:
+        if folder_id not in state["folder_drives"]:
+            folder = service.files().get(fileId=folder_id, fields='driveId', supportsAllDrives=True).execute()
+            state["folder_drives"][folder_id] = folder.get('driveId') or ""
+        drives.setdefault(state["folder_drives"][folder_id], []).append(folder_id)
+
+    for drive_id, drive_folders in drives.items():
+        key = drive_id or "my-drive"
+        # A folder has an entry in pending (often empty) once a run has covered it
+        if key in state["start_page_tokens"] and all(f in state["pending"] for f in drive_folders):
+            changed, new_token = list_changed_google_docs(service, state["start_page_tokens"][key], drive_id)
+            for file in changed:
+                for folder_id in drive_folders:
+                    if folder_id in file.get('parents', []):
+                        found[folder_id][file['id']] = file
+        else:
+            # First run for this drive (or a newly added folder): take the token before
+            # listing, so anything added while listing shows up in the next feed
+            new_token = get_start_page_token(service, drive_id)
+            for folder_id in drive_folders:
+                for file in list_google_docs_files(service, folder_id):
+                    found[folder_id][file['id']] = file
+        state["start_page_tokens"][key] = new_token
+
+    # Docs that failed last time are offered again even though they have not changed
+    for folder_id in folder_ids:
+        for file_id in state["pending"].get(folder_id, []):
+            if file_id not in found[folder_id]:
+                file = get_pending_doc(service, file_id, folder_id)
+                if file:
+                    found[folder_id][file_id] = file
+    return {folder_id: list(files.values()) for folder_id, files in found.items()}
 
 @log_execution_time
 def get_file_content_from_google_drive(service, file_id):
@@ -261,20 +424,105 @@ def create_timestamped_processed_folder(service, archive_id):
     folder = service.files().create(body=meta, fields='id', supportsAllDrives=True).execute()
     return folder['id'], name
 
-def move_files_to_folder(service, file_ids, new_parent_id):
-    for fid in file_ids:
-        file = service.files().get(fileId=fid, fields='parents').execute()
-        prev_parents = ",".join(file.get('parents', []))
-        service.files().update(
-            fileId=fid,
+def is_retryable_drive_error(error):
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status in (429, 500, 502, 503, 504):
+        return True
+    if status == 403:
+        content = getattr(error, 'content', b'')
+        return b'rateLimitExceeded' in content or b'userRateLimitExceeded' in content
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+@log_execution_time
+def execute_batched(service, make_requests, retries=DRIVE_BATCH_RETRIES, base_backoff=DRIVE_BATCH_BACKOFF):
+    # make_requests maps an id to a function that builds the request, since a failed
+    # call is rebuilt for its retry.  Returns the responses and the errors by id.
+    responses = {}
+    errors = {}
+    remaining = list(make_requests)
+    for attempt in range(retries + 1):
+        retry = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                responses[request_id] = response
+                errors.pop(request_id, None)
+            else:
+                errors[request_id] = exception
+                if is_retryable_drive_error(exception) and request_id not in retry:
+                    retry.append(request_id)
+
+        for start in range(0, len(remaining), DRIVE_BATCH_SIZE):
+            request_ids = remaining[start:start + DRIVE_BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=callback)
+            for request_id in request_ids:
+                batch.add(make_requests[request_id](), request_id=request_id)
+            try:
+                batch.execute()
+            except Exception as e:
+                # The batch request itself failed; none of its calls were answered
+                for request_id in request_ids:
+                    if request_id not in responses:
+                        callback(request_id, None, e)
+                        if request_id not in retry:
+                            retry.append(request_id)
+
+        if not retry or attempt == retries:
+            break
+        sleep_time = base_backoff * 2 ** attempt
+        logger.info(f"Retrying {len(retry)} Drive call(s) in {sleep_time}s...")
+        time.sleep(sleep_time)
+        remaining = retry
+    return responses, errors
+
+def move_files_to_folder(service, files, new_parent_id):
+    # files are listing entries, which carry their parents, or bare ids whose parents
+    # are looked up first (batched as well).  Returns the errors by file id.
+    files = [dict(f) if isinstance(f, dict) else {'id': f} for f in files]
+    lookups = {
+        f['id']: partial(service.files().get, fileId=f['id'], fields='parents', supportsAllDrives=True)
+        for f in files if 'parents' not in f
+    }
+    found, errors = execute_batched(service, lookups) if lookups else ({}, {})
+    for f in files:
+        if f['id'] in found:
+            f['parents'] = found[f['id']].get('parents', [])
+
+    moves = {
+        f['id']: partial(
+            service.files().update,
+            fileId=f['id'],
             addParents=new_parent_id,
-            removeParents=prev_parents,
-            fields='id, parents',
+            removeParents=",".join(p for p in f['parents'] if p != new_parent_id),
+            fields='id',
             supportsAllDrives=True
-        ).execute()
-
-def ensure_logs_folder(service, processed_folder_id):
-    query = f"'{processed_folder_id}' in parents and name = 'logs' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
+        )
+        for f in files if f['id'] not in errors
+    }
+    _, move_errors = execute_batched(service, moves)
+    errors.update(move_errors)
+    return errors
+
+def archive_transcripts(service, results, docs_files, processed_id):
+    # Moves the summarized docs into this batch's archive folder in batched requests,
+    # using the parents from the listing, and fails the results of any that could not
+    # be moved
+    docs_by_id = {doc['id']: doc for doc in docs_files}
+    summarized = [docs_by_id[r['file_id']] for r in results if r.get('status') == 'success']
+    if not summarized:
+        return results
+    errors = move_files_to_folder(service, summarized, processed_id)
+    for r in results:
+        if r['file_id'] in errors:
+            r['status'] = 'failed'
+            r['error'] = f"Could not archive {r['file_name']} ({r['file_id']}): {errors[r['file_id']]}"
+            logger.error(r['error'])
+    logger.info(f"Moved {len(summarized) - len(errors)} transcript(s) to archive folder {processed_id}")
+    return results
+
+def ensure_logs_folder(service, archive_id):
+    # One logs folder per archive, shared by all its batches (see RUN LEDGER)
+    query = f"'{archive_id}' in parents and name = 'logs' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
     results = service.files().list(q=query, supportsAllDrives=True, fields="files(id, name)", pageSize=1).execute()
     files = results.get("files", [])
     if files:
@@ -282,77 +530,169 @@ def ensure_logs_folder(service, processed_folder_id):
     meta = {
         'name': 'logs',
         'mimeType': 'application/vnd.google-apps.folder',
-        'parents': [processed_folder_id]
+        'parents': [archive_id]
     }
     folder = service.files().create(body=meta, fields='id', supportsAllDrives=True).execute()
     return folder['id']
 
-def append_to_csv_log(service, logs_folder_id, entries, archive_batch_id, user_folder_id):
-    log_filename = "file_move_log.csv"
-    query = f"'{logs_folder_id}' in parents and name = '{log_filename}' and trashed = false"
-    results = service.files().list(q=query, supportsAllDrives=True, fields="files(id, name)", pageSize=1).execute()
-    log_file = results.get("files", [])
-    fieldnames = [
-        "original_file_id",
-        "file_name",
-        "archive_batch_id",
-        "date_moved",
-        "user_folder_id",
-        "status",
-        "error"
-    ]
-    now = datetime.datetime.now().isoformat()
-    new_lines = [
+# === RUN LEDGER ===
+# The archive's logs folder holds the ledger of every batch.  A batch writes its rows
+# once, as a new shard file, and never reads or rewrites earlier history, so logging
+# costs the same however long the ledger gets and concurrent runs cannot lose each
+# other's rows.  Once LEDGER_COMPACT_SHARDS shards have collected they are merged into
+# one file per month; each merge writes a new generation of the month's file and then
+# trashes the files it read, so compaction never handles more than a month of rows and
+# nothing is rewritten in place.  Every row names the shard it came from, so a row
+# merged twice (say, by two runs compacting at once) is kept only once.
+LEDGER_FIELDS = [
+    "original_file_id",
+    "file_name",
+    "archive_batch_id",
+    "date_moved",
+    "user_folder_id",
+    "status",
+    "error",
+    "shard"
+]
+LEDGER_SHARD_PREFIX = "file_move_log_shard_"
+LEDGER_MONTH_PREFIX = "file_move_log_"
+
+def ledger_rows(entries, archive_batch_id, user_folder_id, shard, date_moved):
+    return [
         {
             "original_file_id": ent.get('file_id', ''),
             "file_name": ent.get('file_name', ''),
             "archive_batch_id": archive_batch_id,
-            "date_moved": now,
+            "date_moved": date_moved,
             "user_folder_id": user_folder_id,
             "status": ent.get('status', ''),
-            "error": ent.get('error', '')
+            "error": ent.get('error', ''),
+            "shard": shard
         }
         for ent in entries if ent is not None and "file_id" in ent
     ]
-    if log_file:
-        log_file_id = log_file[0]['id']
-        request = service.files().get_media(fileId=log_file_id)
-        buf = io.BytesIO()
-        downloader = MediaIoBaseDownload(buf, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        buf.seek(0)
-        csv_text = buf.read().decode('utf-8')
-        output_lines = []
-        reader = csv.DictReader(csv_text.splitlines())
-        output_lines.extend(list(reader))
-        output_lines.extend(new_lines)
-        output_buf = io.StringIO()
-        writer = csv.DictWriter(output_buf, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(output_lines)
-        output_buf.seek(0)
-        media = MediaInMemoryUpload(output_buf.read().encode('utf-8'), mimetype="text/csv")
-        service.files().update(
-            fileId=log_file_id,
-            media_body=media,
-            fields='id'
-        ).execute()
-    else:
-        output_buf = io.StringIO()
-        writer = csv.DictWriter(output_buf, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(new_lines)
-        output_buf.seek(0)
-        media = MediaInMemoryUpload(output_buf.read().encode('utf-8'), mimetype="text/csv")
-        file_metadata = {
-            'name': log_filename,
-            'parents': [logs_folder_id]
-        }
-        service.files().create(
-            body=file_metadata, media_body=media, fields='id', supportsAllDrives=True
+
+def list_ledger_files(service, logs_folder_id, prefix):
+    # Drive's name "contains" matches prefixes of words, so names are checked again
+    query = f"'{logs_folder_id}' in parents and name contains '{prefix}' and trashed = false"
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=query,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True,
+            fields="nextPageToken, files(id, name)",
+            pageSize=1000,
+            pageToken=page_token
         ).execute()
+        files.extend(f for f in results.get("files", []) if f['name'].startswith(prefix))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return sorted(files, key=lambda f: f['name'])
+
+def read_ledger_file(service, file_id):
+    content = service.files().get_media(fileId=file_id, supportsAllDrives=True).execute()
+    return list(csv.DictReader(content.decode('utf-8').splitlines()))
+
+def write_ledger_file(service, logs_folder_id, name, rows):
+    output_buf = io.StringIO()
+    writer = csv.DictWriter(output_buf, fieldnames=LEDGER_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    media = MediaInMemoryUpload(output_buf.getvalue().encode('utf-8'), mimetype="text/csv")
+    file_metadata = {
+        'name': name,
+        'parents': [logs_folder_id]
+    }
+    return service.files().create(
+        body=file_metadata, media_body=media, fields='id', supportsAllDrives=True
+    ).execute()['id']
+
+def mirror_ledger_rows(rows, db_path=LEDGER_DB_FILE):
+    db = sqlite3.connect(db_path, timeout=30)
+    try:
+        with db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS moves ("
+                + ", ".join(f"{field} TEXT" for field in LEDGER_FIELDS)
+                + ", PRIMARY KEY (shard, original_file_id))"
+            )
+            db.executemany(
+                f"INSERT OR IGNORE INTO moves ({', '.join(LEDGER_FIELDS)}) "
+                f"VALUES ({', '.join(':' + field for field in LEDGER_FIELDS)})",
+                rows
+            )
+    finally:
+        db.close()
+
+def shard_month(name):
+    # file_move_log_shard_20250301-093000_<batch id>.csv -> 2025-03
+    stamp = name[len(LEDGER_SHARD_PREFIX):]
+    return f"{stamp[:4]}-{stamp[4:6]}"
+
+@log_execution_time
+def compact_ledger(service, logs_folder_id, shards=None, db_path=LEDGER_DB_FILE):
+    if shards is None:
+        shards = list_ledger_files(service, logs_folder_id, LEDGER_SHARD_PREFIX)
+    by_month = {}
+    for shard in shards:
+        by_month.setdefault(shard_month(shard['name']), []).append(shard)
+    now = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    for month, month_shards in sorted(by_month.items()):
+        merged = list_ledger_files(service, logs_folder_id, f"{LEDGER_MONTH_PREFIX}{month}_") + month_shards
+        rows = {}
+        for file in merged:
+            for row in read_ledger_file(service, file['id']):
+                rows.setdefault((row['shard'], row['original_file_id']), row)
+        rows = sorted(rows.values(), key=lambda row: (row['date_moved'], row['shard']))
+        write_ledger_file(service, logs_folder_id, f"{LEDGER_MONTH_PREFIX}{month}_{now}.csv", rows)
+        mirror_ledger_rows(rows, db_path)
+
+        # Only the files that went into the new generation are retired
+        _, errors = execute_batched(service, {
+            file['id']: partial(
+                service.files().update, fileId=file['id'], body={'trashed': True}, fields='id', supportsAllDrives=True
+            )
+            for file in merged
+        })
+        if errors:
+            logger.warning(f"Could not retire {len(errors)} compacted ledger file(s); the next compaction merges them again")
+        logger.info(f"Compacted {len(month_shards)} ledger shard(s) into the {month} log ({len(rows)} rows)")
+
+@log_execution_time
+def record_batch_in_ledger(service, logs_folder_id, entries, archive_batch_id, user_folder_id, db_path=LEDGER_DB_FILE):
+    now = datetime.datetime.now()
+    shard = f"{LEDGER_SHARD_PREFIX}{now.strftime('%Y%m%d-%H%M%S')}_{archive_batch_id}.csv"
+    rows = ledger_rows(entries, archive_batch_id, user_folder_id, shard, now.isoformat())
+    write_ledger_file(service, logs_folder_id, shard, rows)
+    try:
+        mirror_ledger_rows(rows, db_path)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not update the ledger mirror {db_path}: {e}")
+
+    # Shards are compacted away, so this listing stays about LEDGER_COMPACT_SHARDS long
+    shards = list_ledger_files(service, logs_folder_id, LEDGER_SHARD_PREFIX)
+    if len(shards) >= LEDGER_COMPACT_SHARDS:
+        try:
+            compact_ledger(service, logs_folder_id, shards, db_path)
+        except Exception as e:
+            logger.warning(f"Ledger compaction failed; the next batch tries again: {e}")
+
+# === SUMMARY AND BATCH LOGIC ===
+def parse_summary_reply(assistant_reply):
+    logger.warning(f"OpenAI raw reply: {assistant_reply}")
+
+    json_match = re.search(r'\{.*\}', assistant_reply, re.DOTALL)
+    if not json_match:
+        logger.warning("No valid JSON found in OpenAI reply.")
+        return None, None
+    json_content = json_match.group(0).strip()
+    parsed_json = json.loads(json_content)
+    title = parsed_json.get('title', 'untitled')
+    date = parsed_json.get('date', 'undated')
+    filename = f"{sanitize_filename(date)}_{sanitize_filename(title)}.json"
+    return json_content, filename
 
 def generate_summary_with_retries(transcript, retries=3, base_backoff=10):
     for attempt in range(1, retries+1):
@@ -365,20 +705,7 @@ def generate_summary_with_retries(transcript, retries=3, base_backoff=10):
                 ],
                 max_tokens=MAX_TOKENS
             )
-            assistant_reply = response.choices[0].message.content
-
-            logger.warning(f"OpenAI raw reply: {assistant_reply}")
-
-            json_match = re.search(r'\{.*\}', assistant_reply, re.DOTALL)
-            if not json_match:
-                logger.warning("No valid JSON found in OpenAI reply.")
-                return None, None
-            json_content = json_match.group(0).strip()
-            parsed_json = json.loads(json_content)
-            title = parsed_json.get('title', 'untitled')
-            date = parsed_json.get('date', 'undated')
-            filename = f"{sanitize_filename(date)}_{sanitize_filename(title)}.json"
-            return json_content, filename
+            return parse_summary_reply(response.choices[0].message.content)
         except Exception as e:
             logger.warning(f"OpenAI API call failed on attempt {attempt}/{retries}: {e}")
             if attempt < retries:
@@ -389,7 +716,9 @@ def generate_summary_with_retries(transcript, retries=3, base_backoff=10):
                 logger.error("OpenAI summary generation failed after retries.")
     return None, None
 
-def process_transcript_entry(service, entry, processed_id, output_folder_id):
+def process_transcript_entry(service, entry, output_folder_id):
+    # Download, summarize and upload; the batch archives the successful ones together
+    # afterwards (archive_transcripts)
     file_id = entry['id']
     file_name = entry['name']
     status = "success"
@@ -438,28 +767,6 @@ def process_transcript_entry(service, entry, processed_id, output_folder_id):
             "error": error_message
         }
 
-    # 4. Move file to archive (processed_id)
-    try:
-        file = service.files().get(fileId=file_id, fields='parents').execute()
-        prev_parents = ",".join(file.get('parents', []))
-        service.files().update(
-            fileId=file_id,
-            addParents=processed_id,
-            removeParents=prev_parents,
-            fields='id, parents',
-            supportsAllDrives=True
-        ).execute()
-        logger.info(f"Moved {file_name} to archive folder {processed_id}")
-    except Exception as move_error:
-        status = 'failed'
-        error_message = f"Could not archive {file_name} ({file_id}): {move_error}"
-        logger.error(error_message)
-        return {
-            "file_id": file_id,
-            "file_name": file_name,
-            "status": status,
-            "error": error_message
-        }
     return {
         "file_id": file_id,
         "file_name": file_name,
@@ -470,9 +777,13 @@ def process_transcript_entry(service, entry, processed_id, output_folder_id):
 def batch_summarize_and_archive():
     logger.info("==== Gathering all Google Docs transcripts for all users...")
 
+    service = thread_drive_service()
+    state = load_discovery_state() if DISCOVERY_MODE == "changes" else None
+    folder_docs = discover_transcripts(service, RECORDING_FOLDER_IDS, state)
+    # Anything not processed successfully is retried by the next incremental run
+    pending = {folder_id: [doc['id'] for doc in docs] for folder_id, docs in folder_docs.items()}
     for user_folder_id in RECORDING_FOLDER_IDS:
-        service = authenticate_google_drive()
-        docs_files = list_google_docs_files(service, user_folder_id)
+        docs_files = folder_docs[user_folder_id]
         if not docs_files:
             logger.info(f"No Google Docs files found in recording folder {user_folder_id}; skipping.")
             continue
@@ -482,17 +793,17 @@ def batch_summarize_and_archive():
         try:
             archive_id = ensure_archive_folder(service, user_folder_id)
             processed_id, processed_name = create_timestamped_processed_folder(service, archive_id)
-            logs_folder_id = ensure_logs_folder(service, processed_id)
+            logs_folder_id = ensure_logs_folder(service, archive_id)
         except Exception as e:
             logger.error(f"Could not create archive folders for {user_folder_id}: {e}")
             continue
 
         files_to_log = []
         with ThreadPoolExecutor(max_workers=min(5, len(docs_files))) as executor:
+            # Each worker thread uses its own Drive service, built once per thread
             futures = [
                 executor.submit(
-                    process_transcript_entry, authenticate_google_drive(), entry,
-                    processed_id, OUTPUT_FOLDER_ID
+                    call_with_drive, process_transcript_entry, entry, OUTPUT_FOLDER_ID
                 )
                 for entry in docs_files
             ]
@@ -501,13 +812,149 @@ def batch_summarize_and_archive():
                 if res:
                     files_to_log.append(res)
 
-        append_to_csv_log(service, logs_folder_id, files_to_log, processed_id, user_folder_id)
+        archive_transcripts(service, files_to_log, docs_files, processed_id)
+        record_batch_in_ledger(service, logs_folder_id, files_to_log, processed_id, user_folder_id)
+        pending[user_folder_id] = [x['file_id'] for x in files_to_log if x.get('status') != 'success']
 
         num_failed = sum(1 for x in files_to_log if x.get('status') == 'failed')
         num_success = sum(1 for x in files_to_log if x.get('status') == 'success')
         print(f"Batch for {user_folder_id}: {num_success} succeeded, {num_failed} failed")
 
+    if state is not None:
+        state["pending"] = pending
+        save_discovery_state(state)
+    print("All batches complete.")
+
+# === ASYNC PIPELINE ===
+# Each transcript is a coroutine that passes through download, summarize and upload in
+# turn, and each folder's summarized transcripts are archived together at the end.
+# Every stage has its own semaphore, so while a few transcripts are downloading, dozens
+# can be waiting on OpenAI and others uploading, all at once and without a thread per
+# transcript.  OpenAI is called through AsyncOpenAI; the Drive client library is
+# blocking, so Drive calls run on a small pool of threads, each with its own Drive
+# service (see thread_drive_service).
+
+def prepare_batch_folders(service, user_folder_id):
+    archive_id = ensure_archive_folder(service, user_folder_id)
+    processed_id, _ = create_timestamped_processed_folder(service, archive_id)
+    logs_folder_id = ensure_logs_folder(service, archive_id)
+    return processed_id, logs_folder_id
+
+async def generate_summary_with_retries_async(transcript, retries=3, base_backoff=10):
+    for attempt in range(1, retries+1):
+        try:
+            response = await async_client.chat.completions.create(
+                model=OPENAI_MODEL_NAME,
+                messages=[
+                    {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                    {"role": "user", "content": transcript},
+                ],
+                max_tokens=MAX_TOKENS
+            )
+            return parse_summary_reply(response.choices[0].message.content)
+        except Exception as e:
+            logger.warning(f"OpenAI API call failed on attempt {attempt}/{retries}: {e}")
+            if attempt < retries:
+                sleep_time = base_backoff * attempt
+                logger.info(f"Retrying in {sleep_time}s...")
+                await asyncio.sleep(sleep_time)
+            else:
+                logger.error("OpenAI summary generation failed after retries.")
+    return None, None
+
+async def process_transcript_entry_async(drive, limits, entry, output_folder_id):
+    file_id = entry['id']
+    file_name = entry['name']
+
+    def failed(error_message):
+        logger.error(error_message)
+        return {"file_id": file_id, "file_name": file_name, "status": "failed", "error": error_message}
+
+    # 1. Download transcript
+    try:
+        async with limits["download"]:
+            transcript = await drive(get_file_content_from_google_drive, file_id)
+        if not transcript:
+            raise Exception("Transcript download failed")
+    except Exception as e:
+        return failed(f"Transcript download failed: {e}")
+
+    # 2. Create summary (with retry)
+    async with limits["summarize"]:
+        json_content, output_filename = await generate_summary_with_retries_async(transcript, retries=3)
+    if not json_content or not output_filename:
+        return failed(f"Summary generation failed (see logs for detail) for file {file_name}")
+
+    # 3. Upload summary
+    try:
+        async with limits["upload"]:
+            await drive(upload_content_to_google_drive, json_content, output_filename, output_folder_id)
+    except Exception as e:
+        return failed(f"Summary upload failed: {e}")
+    return {"file_id": file_id, "file_name": file_name, "status": "success", "error": ""}
+
+async def summarize_folder_async(drive, limits, user_folder_id, docs_files):
+    # Returns the ids of the docs that were not processed successfully
+    if not docs_files:
+        logger.info(f"No Google Docs files found in recording folder {user_folder_id}; skipping.")
+        return []
+    print(f"Found {len(docs_files)} transcript file(s) in {user_folder_id}")
+
+    try:
+        processed_id, logs_folder_id = await drive(prepare_batch_folders, user_folder_id)
+    except Exception as e:
+        logger.error(f"Could not create archive folders for {user_folder_id}: {e}")
+        return [doc['id'] for doc in docs_files]
+
+    files_to_log = await asyncio.gather(*[
+        process_transcript_entry_async(drive, limits, entry, OUTPUT_FOLDER_ID)
+        for entry in docs_files
+    ])
+    await drive(archive_transcripts, files_to_log, docs_files, processed_id)
+    await drive(record_batch_in_ledger, logs_folder_id, files_to_log, processed_id, user_folder_id)
+
+    num_failed = sum(1 for x in files_to_log if x.get('status') == 'failed')
+    num_success = sum(1 for x in files_to_log if x.get('status') == 'success')
+    print(f"Batch for {user_folder_id}: {num_success} succeeded, {num_failed} failed")
+    return [x['file_id'] for x in files_to_log if x.get('status') != 'success']
+
+async def batch_summarize_and_archive_async():
+    logger.info("==== Gathering all Google Docs transcripts for all users (async pipeline)...")
+    limits = {
+        "download": asyncio.Semaphore(DOWNLOAD_CONCURRENCY),
+        "summarize": asyncio.Semaphore(SUMMARY_CONCURRENCY),
+        "upload": asyncio.Semaphore(UPLOAD_CONCURRENCY),
+    }
+    # Enough Drive threads for every Drive stage to run at its limit, plus one for
+    # listing, folder set-up and archiving
+    drive_threads = DOWNLOAD_CONCURRENCY + UPLOAD_CONCURRENCY + 1
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=drive_threads, thread_name_prefix="drive") as executor:
+        def drive(func, *args):
+            return loop.run_in_executor(executor, call_with_drive, func, *args)
+
+        state = load_discovery_state() if DISCOVERY_MODE == "changes" else None
+        folder_docs = await drive(discover_transcripts, RECORDING_FOLDER_IDS, state)
+
+        # All folders share the stage limits, so one large folder doesn't hold the rest back
+        outcomes = await asyncio.gather(*[
+            summarize_folder_async(drive, limits, user_folder_id, folder_docs[user_folder_id])
+            for user_folder_id in RECORDING_FOLDER_IDS
+        ], return_exceptions=True)
+        pending = {}
+        for user_folder_id, outcome in zip(RECORDING_FOLDER_IDS, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Batch for {user_folder_id} failed: {outcome}")
+                outcome = [doc['id'] for doc in folder_docs[user_folder_id]]
+            pending[user_folder_id] = outcome
+        if state is not None:
+            state["pending"] = pending
+            save_discovery_state(state)
+    await async_client.close()
     print("All batches complete.")
 
 if __name__ == "__main__":
-    batch_summarize_and_archive()
\ No newline at end of file
+    if PIPELINE_ENGINE == "threads":
+        batch_summarize_and_archive()
+    else:
+        asyncio.run(batch_summarize_and_archive_async())
\ No newline at end of file